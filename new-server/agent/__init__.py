@@ -4,6 +4,18 @@ This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
 """
 
-from agent.graph import graph
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    # Building the graph connects to the vector store, so it is only imported
+    # when asked for; the agent's other modules can be imported on their own
+    if name == "graph":
+        from agent.graph import graph
+
+        # Importing the submodule bound its name here; rebind it to the graph
+        globals()["graph"] = graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,304 @@
+"""Latency-aware circuit breaker with hedged requests.
+
+When the remote vector store is slow or down, every retrieval would otherwise
+wait for the HTTP timeout. Calls through the breaker are bounded instead:
+
+- a second, identical request is started if the first has not answered
+  after ``hedge_after`` seconds, and whichever finishes first wins;
+- after ``timeout`` seconds the call gives up and the fallback answers;
+- when too many recent calls failed or were slower than ``slow_call``, the
+  breaker opens and sends every call straight to the fallback for
+  ``cooldown`` seconds, then lets a single probe through to test recovery.
+
+Synchronous calls go through ``call_sync``, which opens, probes and falls
+back the same way but cannot hedge or time out a blocking call.
+
+The breaker's state, counters and latency percentiles are available from
+``metrics()``. Callers that cache results run them inside ``watch()`` to learn
+whether any call was answered by a fallback or made while the breaker was not
+closed, since those results should not outlive the outage.
+
+``old-server/app/breaker.py`` is a copy with the same API for the old server,
+which cannot import from this package.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+VECTOR_TIMEOUT = float(os.getenv("VECTOR_TIMEOUT", "3.0"))
+VECTOR_HEDGE_AFTER = float(os.getenv("VECTOR_HEDGE_AFTER", "0.5"))
+VECTOR_SLOW_CALL = float(os.getenv("VECTOR_SLOW_CALL", "1.5"))
+VECTOR_BREAKER_COOLDOWN = float(os.getenv("VECTOR_BREAKER_COOLDOWN", "30"))
+# Opens when this share of the last BREAKER_WINDOW calls failed or was slow
+BREAKER_FAILURE_RATIO = 0.5
+BREAKER_WINDOW = 50
+BREAKER_MIN_CALLS = 10
+
+
+class BreakerOpenError(RuntimeError):
+    """Raised when the breaker is open and there is no fallback."""
+
+
+class Watch:
+    """Whether any breaker call in a ``watch()`` block was degraded."""
+
+    degraded = False
+
+
+_watch: ContextVar[Optional[Watch]] = ContextVar("breaker_watch", default=None)
+
+
+@contextmanager
+def watch() -> Iterator[Watch]:
+    """Watch the breaker calls made within the block, including in child tasks."""
+    current = Watch()
+    token = _watch.set(current)
+    try:
+        yield current
+    finally:
+        _watch.reset(token)
+
+
+def mark_degraded() -> None:
+    """Flag the current ``watch()`` block, e.g. when a fallback answered."""
+    current = _watch.get()
+    if current is not None:
+        current.degraded = True
+
+
+def _percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class CircuitBreaker:
+    """Bound the latency of calls to a remote dependency.
+
+    Args:
+        name: Name used in log lines and metrics.
+        timeout: Seconds before a call is abandoned for the fallback.
+        hedge_after: Seconds before a second request is started. Set it to
+            ``timeout`` or more to disable hedging.
+        slow_call: Calls slower than this count against the dependency.
+        failure_ratio: Share of failed or slow calls in the window that opens
+            the breaker.
+        window: Number of recent calls considered.
+        min_calls: Calls needed in the window before the breaker can open.
+        cooldown: Seconds the breaker stays open before probing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = VECTOR_TIMEOUT,
+        hedge_after: float = VECTOR_HEDGE_AFTER,
+        slow_call: float = VECTOR_SLOW_CALL,
+        failure_ratio: float = BREAKER_FAILURE_RATIO,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        cooldown: float = VECTOR_BREAKER_COOLDOWN,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.slow_call = slow_call
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        # allow() and record() are also called from call_sync's threads
+        self._lock = threading.Lock()
+        # (succeeded, seconds) of recent calls
+        self._recent: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.counts: Dict[str, int] = dict.fromkeys(
+            ["calls", "failures", "timeouts", "slow_calls", "hedges", "hedge_wins",
+             "fallbacks", "rejected", "opened"],
+            0,
+        )
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency. Half open, this claims the probe."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._transition("half_open")
+            # Half open: one probe at a time
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def _transition(self, state: str) -> None:
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == "open":
+            self._opened_at = time.monotonic()
+            self.counts["opened"] += 1
+        if state == "closed":
+            self._recent.clear()
+
+    def record(self, succeeded: bool, seconds: float) -> None:
+        """Record the outcome of a call that ``allow()`` let through."""
+        with self._lock:
+            slow = seconds > self.slow_call
+            self.counts["slow_calls"] += slow
+            self._recent.append((succeeded and not slow, seconds))
+            if self.state == "half_open":
+                self._probing = False
+                self._transition("closed" if succeeded and not slow else "open")
+                return
+            bad = sum(1 for ok, _ in self._recent if not ok)
+            if (
+                self.state == "closed"
+                and len(self._recent) >= self.min_calls
+                and bad / len(self._recent) >= self.failure_ratio
+            ):
+                self._transition("open")
+
+    async def _hedged(self, primary: Callable[[], Awaitable[T]]) -> T:
+        first = asyncio.ensure_future(primary())
+        tasks = {first}
+        hedged = False
+        deadline = time.monotonic() + self.timeout
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                wait = deadline - time.monotonic()
+                if not hedged:
+                    wait = min(wait, self.hedge_after)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        self.counts["hedge_wins"] += task is not first
+                        return task.result()
+                    error = task.exception()
+                if time.monotonic() >= deadline:
+                    self.counts["timeouts"] += 1
+                    raise asyncio.TimeoutError(f"{self.name} timed out")
+                if not hedged and not done:
+                    hedged = True
+                    self.counts["hedges"] += 1
+                    tasks.add(asyncio.ensure_future(primary()))
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _reject(self, fallback: Optional[Callable[[], T]]) -> T:
+        self.counts["rejected"] += 1
+        if fallback is None:
+            raise BreakerOpenError(f"{self.name} is unavailable")
+        self.counts["fallbacks"] += 1
+        return fallback()
+
+    def _failed(self, error: Exception, seconds: float, has_fallback: bool) -> None:
+        self.counts["failures"] += 1
+        self.record(False, seconds)
+        if has_fallback:
+            print(f"Circuit breaker {self.name}: falling back after {error!r}")
+            self.counts["fallbacks"] += 1
+            mark_degraded()
+
+    def _cancelled(self, seconds: float) -> None:
+        # Cancelled, e.g. the client went away. A probe that never finished
+        # counts as failed, so the breaker does not stay half open forever.
+        if self.state == "half_open":
+            self.counts["failures"] += 1
+            self.record(False, seconds)
+
+    async def call(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        fallback: Optional[Callable[[], Awaitable[T]]] = None,
+    ) -> T:
+        """Run ``primary`` within the breaker, or ``fallback`` if it can't answer."""
+        self.counts["calls"] += 1
+        if self.state != "closed":
+            mark_degraded()
+        if not self.allow():
+            return await self._reject(fallback)
+
+        start = time.monotonic()
+        try:
+            result = await self._hedged(primary)
+        except Exception as e:
+            self._failed(e, time.monotonic() - start, fallback is not None)
+            if fallback is None:
+                raise
+            return await fallback()
+        except BaseException:
+            self._cancelled(time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def call_sync(
+        self, primary: Callable[[], T], fallback: Optional[Callable[[], T]] = None
+    ) -> T:
+        """Blocking version of ``call``, without hedging or a timeout."""
+        self.counts["calls"] += 1
+        if self.state != "closed":
+            mark_degraded()
+        if not self.allow():
+            return self._reject(fallback)
+
+        start = time.monotonic()
+        try:
+            result = primary()
+        except Exception as e:
+            self._failed(e, time.monotonic() - start, fallback is not None)
+            if fallback is None:
+                raise
+            return fallback()
+        except BaseException:
+            self._cancelled(time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = [seconds for _, seconds in self._recent]
+        return {
+            "name": self.name,
+            "state": self.state,
+            **self.counts,
+            "window": len(latencies),
+            "p50_ms": _ms(_percentile(latencies, 0.5)),
+            "p95_ms": _ms(_percentile(latencies, 0.95)),
+            "p99_ms": _ms(_percentile(latencies, 0.99)),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else round(seconds * 1000)
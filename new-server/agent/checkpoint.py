@@ -0,0 +1,507 @@
+"""A durable local checkpointer for conversations, backed by SQLite.
+
+Channel values are stored once per channel version, so a checkpoint only writes
+the channels that changed. The message list is delta-encoded on top of that:
+each message is stored once per thread, keyed by a digest of its serialized
+form, and a message-list version is just the ordered list of digests. Resuming a
+thread reads the latest checkpoint row and the blobs and messages it references,
+never the full history of checkpoints.
+
+Old checkpoints are compacted periodically: only the most recent ones are kept
+per thread, and blobs and messages no longer referenced are removed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+# Blob type marking a message list stored as references to the messages table
+_MESSAGE_REFS = "msgrefs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    digest TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, digest)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """Persist graph checkpoints in a local SQLite database.
+
+    Args:
+        path (str): The path of the database file.
+        keep_last (int): The number of checkpoints kept per thread on compaction.
+        compact_every (int): Compact a thread after this many new checkpoints.
+    """
+
+    def __init__(self, path: str, keep_last: int = 20, compact_every: int = 50):
+        super().__init__()
+        self.keep_last = keep_last
+        self.compact_every = compact_every
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self._puts_since_compaction: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    # Encoding
+
+    def _dump_value(
+        self, thread_id: str, checkpoint_ns: str, value: Any
+    ) -> Tuple[str, bytes]:
+        """Serialize a channel value, storing message lists as digests."""
+        if not (
+            isinstance(value, list)
+            and value
+            and all(isinstance(m, BaseMessage) for m in value)
+        ):
+            return self.serde.dumps_typed(value)
+
+        digests = []
+        rows = []
+        for message in value:
+            type_, data = self.serde.dumps_typed(message)
+            digest = hashlib.sha1(type_.encode() + data).hexdigest()
+            digests.append(digest)
+            rows.append((thread_id, checkpoint_ns, digest, type_, data))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?)", rows
+        )
+        return _MESSAGE_REFS, json.dumps(digests).encode()
+
+    def _load_values(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> Dict[str, Any]:
+        """Load the channel values for a set of channel versions."""
+        if not versions:
+            return {}
+
+        rows = []
+        for channel, version in versions.items():
+            rows.extend(
+                self.conn.execute(
+                    "SELECT channel, type, value FROM blobs WHERE thread_id = ? "
+                    "AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (thread_id, checkpoint_ns, channel, str(version)),
+                ).fetchall()
+            )
+
+        values: Dict[str, Any] = {}
+        for channel, type_, data in rows:
+            if type_ == "empty":
+                continue
+            if type_ == _MESSAGE_REFS:
+                values[channel] = self._load_messages(
+                    thread_id, checkpoint_ns, json.loads(data)
+                )
+            else:
+                values[channel] = self.serde.loads_typed((type_, data))
+        return values
+
+    def _load_messages(
+        self, thread_id: str, checkpoint_ns: str, digests: List[str]
+    ) -> List[BaseMessage]:
+        """Load a message list from its digests. Raises ValueError if any is missing."""
+        unique = list(dict.fromkeys(digests))
+        found: Dict[str, BaseMessage] = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(unique), 500):
+            chunk = unique[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for digest, type_, data in self.conn.execute(
+                f"SELECT digest, type, value FROM messages WHERE thread_id = ? "
+                f"AND checkpoint_ns = ? AND digest IN ({placeholders})",
+                (thread_id, checkpoint_ns, *chunk),
+            ):
+                found[digest] = self.serde.loads_typed((type_, data))
+        missing = [d for d in unique if d not in found]
+        if missing:
+            # Returning the rest would silently truncate the conversation
+            raise ValueError(
+                f"Checkpoint of thread {thread_id!r} references {len(missing)} "
+                f"missing messages, e.g. {missing[0]}"
+            )
+        return [found[d] for d in digests]
+
+    def _tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        parent_checkpoint_id: Optional[str],
+        type_: str,
+        checkpoint_data: bytes,
+        metadata_data: bytes,
+    ) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_data))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_values(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=json.loads(metadata_data),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((t, v)))
+                for task_id, channel, t, v in writes
+            ],
+        )
+
+    # Sync API
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get the requested checkpoint, or the latest one for the thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.lock:
+            row = self.conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            return self._tuple(thread_id, checkpoint_ns, *row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first."""
+        clauses = []
+        params: List[Any] = []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata FROM checkpoints"
+        )
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = json.loads(row[6])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self.lock:
+                item = self._tuple(*row)
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint, writing only the channels that changed."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+
+        with self.lock, self.conn:
+            blob_rows = []
+            for channel, version in new_versions.items():
+                if channel in values:
+                    type_, data = self._dump_value(
+                        thread_id, checkpoint_ns, values[channel]
+                    )
+                else:
+                    type_, data = "empty", b""
+                blob_rows.append(
+                    (thread_id, checkpoint_ns, channel, str(version), type_, data)
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blob_rows
+            )
+
+            type_, data = self.serde.dumps_typed(c)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    data,
+                    json.dumps(metadata, default=str).encode(),
+                ),
+            )
+
+            key = (thread_id, checkpoint_ns)
+            self._puts_since_compaction[key] += 1
+            if self._puts_since_compaction[key] >= self.compact_every:
+                self._puts_since_compaction[key] = 0
+                self._compact(thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store intermediate writes for a checkpoint."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        # Special writes (errors, interrupts) replace earlier ones; regular ones don't
+        rows: Dict[str, List[Tuple[Any, ...]]] = {"REPLACE": [], "IGNORE": []}
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            conflict = "REPLACE" if channel in WRITES_IDX_MAP else "IGNORE"
+            rows[conflict].append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    type_,
+                    data,
+                    task_path,
+                )
+            )
+        with self.lock, self.conn:
+            for conflict, conflict_rows in rows.items():
+                self.conn.executemany(
+                    f"INSERT OR {conflict} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    conflict_rows,
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete all checkpoints, writes and values of a thread."""
+        with self.lock, self.conn:
+            for table in ("checkpoints", "blobs", "messages", "writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # Compaction
+
+    def _compact(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop old checkpoints of a thread and everything only they referenced.
+
+        Must be called with the lock held, inside a transaction.
+        """
+        stale = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+            "AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last),
+        ).fetchall()
+        if not stale:
+            return
+
+        # Checkpoint ids sort by time, so this drops it and everything older
+        newest_dropped = stale[0][0]
+        for table in ("checkpoints", "writes"):
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id <= ?",
+                (thread_id, checkpoint_ns, newest_dropped),
+            )
+
+        # Blobs and messages still referenced by the remaining checkpoints
+        live_blobs = set()
+        for type_, data in self.conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? "
+            "AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ):
+            checkpoint = self.serde.loads_typed((type_, data))
+            for channel, version in checkpoint["channel_versions"].items():
+                live_blobs.add((channel, str(version)))
+
+        live_messages = set()
+        dead_blobs = []
+        for channel, version, type_, data in self.conn.execute(
+            "SELECT channel, version, type, value FROM blobs WHERE thread_id = ? "
+            "AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ).fetchall():
+            if (channel, version) not in live_blobs:
+                dead_blobs.append((thread_id, checkpoint_ns, channel, version))
+            elif type_ == _MESSAGE_REFS:
+                live_messages.update(json.loads(data))
+
+        self.conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND channel = ? AND version = ?",
+            dead_blobs,
+        )
+
+        dead_messages = [
+            (thread_id, checkpoint_ns, digest)
+            for (digest,) in self.conn.execute(
+                "SELECT digest FROM messages WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            ).fetchall()
+            if digest not in live_messages
+        ]
+        self.conn.executemany(
+            "DELETE FROM messages WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND digest = ?",
+            dead_messages,
+        )
+
+    # Async API
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
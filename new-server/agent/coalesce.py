@@ -0,0 +1,215 @@
+"""Coalesce identical in-flight model calls.
+
+When many users ask the same question at once, every run would otherwise make
+the same LLM calls. Calls with identical inputs share a single upstream request;
+every caller replays its streamed chunks through their own callbacks, so token
+streaming and tracing behave as if each run had called the model itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessageChunk,
+    AnyMessage,
+    BaseMessage,
+    message_chunk_to_message,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    def __init__(self) -> None:
+        self.items: List[T] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight(Generic[T]):
+    """Share one async stream between all concurrent callers with the same key.
+
+    The first caller starts the stream; later callers attach to it and receive
+    every item from the beginning. The stream runs to completion even if its
+    subscribers go away, and the key is released as soon as it finishes.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight[T]] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """Subscribe to the stream for key, starting it with factory if needed."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            # Run in a fresh context so the shared stream is not attached to
+            # the first caller's run tree and callbacks
+            flight.task = asyncio.create_task(
+                self._run(key, flight, factory), context=contextvars.Context()
+            )
+        return self._subscribe(flight)
+
+    async def _run(
+        self, key: str, flight: _Flight[T], factory: Callable[[], AsyncIterator[T]]
+    ) -> None:
+        try:
+            async for item in factory():
+                async with flight.changed:
+                    flight.items.append(item)
+                    flight.changed.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    async def _subscribe(self, flight: _Flight[T]) -> AsyncIterator[T]:
+        position = 0
+        while True:
+            async with flight.changed:
+                await flight.changed.wait_for(
+                    lambda: len(flight.items) > position or flight.done
+                )
+            while position < len(flight.items):
+                yield flight.items[position]
+                position += 1
+            if flight.done and position >= len(flight.items):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+
+class _ReplayChatModel(BaseChatModel):
+    """A chat model that emits chunks produced by a shared upstream call.
+
+    Sync calls are not shared; they go straight to ``model`` with ``prompt``.
+    """
+
+    source: Any
+    model: Any
+    prompt: List[Any]
+
+    @property
+    def _llm_type(self) -> str:
+        return "coalesced"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.model.invoke(self.prompt, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # Chunks are shared between callers, so hand each one its own copy
+        async for chunk in self.source:
+            yield ChatGenerationChunk(message=chunk.model_copy())
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        aggregate: Optional[AIMessageChunk] = None
+        async for chunk in self.source:
+            aggregate = chunk.model_copy() if aggregate is None else aggregate + chunk
+        if aggregate is None:
+            aggregate = AIMessageChunk(content="")
+        return ChatResult(
+            generations=[ChatGeneration(message=message_chunk_to_message(aggregate))]
+        )
+
+
+_model_calls: SingleFlight[AIMessageChunk] = SingleFlight()
+
+
+def _call_key(model: str, system_prompt: str, messages: Sequence[AnyMessage]) -> str:
+    """Build a key from everything that affects the model's output.
+
+    Message ids are left out since they differ between otherwise identical runs.
+    """
+    payload = [
+        {
+            "type": message.type,
+            "content": message.content,
+            "name": message.name,
+            "tool_calls": getattr(message, "tool_calls", None),
+            "tool_call_id": getattr(message, "tool_call_id", None),
+        }
+        for message in messages
+    ]
+    raw = json.dumps([model, system_prompt, payload], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def coalesced_model(
+    model: Runnable,
+    model_name: str,
+    system_prompt: str,
+    system_message: str,
+    messages: Sequence[AnyMessage],
+) -> BaseChatModel:
+    """Return a chat model whose call is shared with identical concurrent calls.
+
+    Args:
+        model (Runnable): The model, with tools already bound.
+        model_name (str): The fully specified model name, used in the key.
+        system_prompt (str): The unformatted system prompt, used in the key.
+        system_message (str): The formatted system message sent to the model.
+        messages (Sequence[AnyMessage]): The conversation sent to the model.
+
+    Returns:
+        BaseChatModel: A model to invoke with the caller's config in place of
+        the original one.
+    """
+    key = _call_key(model_name, system_prompt, messages)
+    prompt = [{"role": "system", "content": system_message}, *messages]
+    return _ReplayChatModel(
+        source=_model_calls.stream(key, lambda: model.astream(prompt)),
+        model=model,
+        prompt=prompt,
+    )
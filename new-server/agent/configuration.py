@@ -30,6 +30,132 @@ class Configuration:
         },
     )
 
+    model_routing: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to use the planner model for steps that choose tools and "
+            "the main model only for answers grounded in tool results."
+        },
+    )
+
+    planner_model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
+        default="openai/gpt-4o-mini",
+        metadata={
+            "description": "The name of the fast language model used for tool selection when "
+            "model routing is enabled. Should be in the form: provider/model-name."
+        },
+    )
+
+    query_rewriting: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to rewrite retriever queries into standalone variants "
+            "using the conversation before searching the vector store."
+        },
+    )
+
+    query_rewrite_model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = (
+        field(
+            default="openai/gpt-4o-mini",
+            metadata={
+                "description": "The name of the language model used to rewrite retriever queries. "
+                "Should be in the form: provider/model-name."
+            },
+        )
+    )
+
+    num_query_variants: int = field(
+        default=3,
+        metadata={
+            "description": "The number of query variants to generate when query rewriting is enabled."
+        },
+    )
+
+    rerank: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to rerank retrieved documents with a local cross-encoder "
+            "before returning them to the agent."
+        },
+    )
+
+    rerank_model: str = field(
+        default="Xenova/ms-marco-MiniLM-L-6-v2",
+        metadata={
+            "description": "The name of the ONNX cross-encoder model used for reranking."
+        },
+    )
+
+    rerank_candidates: int = field(
+        default=12,
+        metadata={
+            "description": "The number of child chunks fetched from the vector store per query "
+            "when reranking is enabled."
+        },
+    )
+
+    rerank_top_n: int = field(
+        default=4,
+        metadata={
+            "description": "The number of documents kept after reranking."
+        },
+    )
+
+    rerank_batch_size: int = field(
+        default=32,
+        metadata={
+            "description": "The number of query-document pairs scored per cross-encoder batch."
+        },
+    )
+
+    rerank_timeout: float = field(
+        default=1.0,
+        metadata={
+            "description": "The latency budget for reranking, in seconds. If it is exceeded, "
+            "documents are returned in vector-similarity order."
+        },
+    )
+
+    speculative_retrieval: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to start retrieval for the user message while the first "
+            "model call of a turn is running, and reuse the results if the model's retriever "
+            "query matches."
+        },
+    )
+
+    speculative_match_threshold: float = field(
+        default=0.7,
+        metadata={
+            "description": "The share of the retriever query's terms that must appear in the "
+            "user message for the speculative results to be reused."
+        },
+    )
+
+    coalesce_requests: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether identical concurrent model calls share a single upstream "
+            "request, with every run receiving the streamed output."
+        },
+    )
+
+    faq_answers: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to serve precomputed answers when a new conversation "
+            "opens with one of the curated frequently asked questions."
+        },
+    )
+
+    faq_path: str = field(
+        default="./data/faq/answers.json",
+        metadata={
+            "description": "The path of the precomputed answers written by data/config/faq.py."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -0,0 +1,122 @@
+"""Near-duplicate detection with MinHash and locality-sensitive hashing.
+
+Overlapping splitter settings, the same testimony present under two file
+names, or a re-exported transcript all produce chunks that are almost
+identical. Each one costs an embedding and a vector, and duplicates crowd
+each other out of the top-k.
+
+Each text is reduced to a MinHash signature of its word shingles. Signatures
+are split into bands, and texts sharing any band are compared by the share
+of matching signature values, an estimate of the Jaccard similarity of their
+shingles. Texts at or above the threshold are duplicates of the first text
+seen.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Mersenne prime for the universal hash family a * x + b mod p
+_PRIME = np.uint64((1 << 61) - 1)
+_word = re.compile(r"\w+")
+
+
+class NearDuplicateIndex:
+    """Incremental near-duplicate lookup over a stream of texts.
+
+    Args:
+        threshold: Estimated Jaccard similarity at which texts are duplicates.
+        num_perm: MinHash signature length.
+        bands: LSH bands; ``num_perm`` must be divisible by it. More bands
+            find pairs with lower similarity, at the cost of more comparisons.
+        shingle_size: Words per shingle.
+        seed: Seed of the hash permutations.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multipliers below 2**31 keep a * x + b within 64 bits for 32-bit x
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._exact: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [
+            defaultdict(list) for _ in range(bands)
+        ]
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _word.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        grams = {
+            " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))
+        }
+        return np.fromiter(
+            (zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles."""
+        shingles = self._shingles(text)
+        hashes = (np.outer(self._a, shingles) + self._b[:, None]) % _PRIME
+        return hashes.min(axis=1)
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        """Index ``text`` under ``key`` unless it duplicates an indexed text.
+
+        Returns:
+            The key of the earlier text it duplicates, or None if it was added.
+        """
+        digest = hashlib.sha1(" ".join(text.split()).encode()).hexdigest()
+        if digest in self._exact:
+            return self._exact[digest]
+
+        signature = self.signature(text)
+        bands = [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+        candidates = dict.fromkeys(
+            other for band, bucket in zip(bands, self._buckets) for other in bucket[band]
+        )
+        for other in candidates:
+            if np.mean(self._signatures[other] == signature) >= self.threshold:
+                return other
+
+        self._exact[digest] = key
+        self._signatures[key] = signature
+        for band, bucket in zip(bands, self._buckets):
+            bucket[band].append(key)
+        return None
+
+
+def deduplicate(
+    items: List[Tuple[str, str]], index: NearDuplicateIndex
+) -> Tuple[List[str], Dict[str, str]]:
+    """Split (key, text) pairs into kept keys and a duplicate -> original map."""
+    kept, duplicates = [], {}
+    for key, text in items:
+        original = index.add(key, text)
+        if original is None:
+            kept.append(key)
+        else:
+            duplicates[key] = original
+    return kept, duplicates
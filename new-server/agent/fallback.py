@@ -0,0 +1,164 @@
+"""Local read-only fallback for the remote vector index.
+
+Each index build also embeds its child chunks into a ``LocalVectorIndex``
+next to its docstore. When the circuit breaker gives up on Upstash, the
+retriever searches this local copy instead and maps the matching children to
+their parents in the same docstore, so answers come from the same version of
+the corpus, just from a slightly different embedding model.
+
+Upstash embeds the chunks server-side, so the local index uses its own
+OpenAI embedding model. Only the query embedding is computed per request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.stores import BaseStore
+from langchain_openai import OpenAIEmbeddings
+
+from agent.breaker import CircuitBreaker
+from agent.local_index import LocalVectorIndex
+
+FALLBACK_EMBEDDING_MODEL = "text-embedding-3-small"
+# Chunks embedded per request while building the index
+EMBED_BATCH_SIZE = 256
+
+
+def fallback_path(namespace: str) -> str:
+    return f"./data/vectorstore/local-{namespace}"
+
+
+def fallback_embeddings() -> Embeddings:
+    return OpenAIEmbeddings(model=FALLBACK_EMBEDDING_MODEL)
+
+
+def is_current(path: str, children: Sequence[Tuple[str, Document]]) -> bool:
+    """Whether the index at path already holds exactly these children."""
+    if not os.path.exists(os.path.join(path, "index.json")):
+        return False
+    return LocalVectorIndex.load(path).ids == [child_id for child_id, _ in children]
+
+
+async def build_fallback_index(
+    children: Sequence[Tuple[str, Document]],
+    path: str,
+    embeddings: Embeddings,
+    id_key: str = "doc_id",
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> LocalVectorIndex:
+    """Embed the child chunks and save them as an int8 index at path."""
+    vectors: List[List[float]] = []
+    for start in range(0, len(children), batch_size):
+        batch = children[start : start + batch_size]
+        vectors += await embeddings.aembed_documents(
+            [child.page_content for _, child in batch]
+        )
+    index = LocalVectorIndex.from_vectors(
+        vectors,
+        [child_id for child_id, _ in children],
+        [{id_key: child.metadata[id_key]} for _, child in children],
+        quantization="int8",
+    )
+    index.save(path)
+    return index
+
+
+@lru_cache(maxsize=2)
+def load_fallback_index(path: str) -> LocalVectorIndex:
+    return LocalVectorIndex.load(path)
+
+
+class LocalFallbackRetriever(BaseRetriever):
+    """Parent documents for the nearest children in the local fallback index.
+
+    Mirrors ParentDocumentRetriever: the ``k`` nearest children are mapped to
+    their parents, in rank order and without repeats.
+    """
+
+    path: str
+    docstore: BaseStore[str, Document]
+    embeddings: Any
+    id_key: str = "doc_id"
+    k: int = 4
+
+    def _parent_ids(self, vector: List[float]) -> List[str]:
+        ids: List[str] = []
+        for _, _, metadata in load_fallback_index(self.path).search(vector, self.k):
+            if metadata[self.id_key] not in ids:
+                ids.append(metadata[self.id_key])
+        return ids
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        ids = self._parent_ids(self.embeddings.embed_query(query))
+        return [doc for doc in self.docstore.mget(ids) if doc is not None]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        ids = await asyncio.to_thread(self._parent_ids, vector)
+        return [doc for doc in await self.docstore.amget(ids) if doc is not None]
+
+
+class ResilientRetriever(BaseRetriever):
+    """Query ``primary`` through a circuit breaker, falling back to ``fallback``.
+
+    ``search_kwargs`` overrides the primary's (e.g. a larger ``k`` for
+    reranking); its ``k`` also applies to the fallback. Answers from the
+    fallback mark the enclosing ``breaker.watch()`` block as degraded.
+    """
+
+    primary: BaseRetriever
+    fallback: Optional[BaseRetriever] = None
+    breaker: CircuitBreaker
+    search_kwargs: Dict[str, Any] = {}
+
+    def _with_kwargs(self) -> Tuple[BaseRetriever, Optional[BaseRetriever]]:
+        if not self.search_kwargs:
+            return self.primary, self.fallback
+        primary = self.primary.model_copy(
+            update={
+                "search_kwargs": {
+                    **getattr(self.primary, "search_kwargs", {}),
+                    **self.search_kwargs,
+                }
+            }
+        )
+        fallback = self.fallback
+        if fallback is not None and "k" in self.search_kwargs:
+            fallback = fallback.model_copy(update={"k": self.search_kwargs["k"]})
+        return primary, fallback
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        primary, fallback = self._with_kwargs()
+        config = {"callbacks": run_manager.get_child()}
+        return self.breaker.call_sync(
+            lambda: primary.invoke(query, config),
+            (lambda: fallback.invoke(query, config)) if fallback is not None else None,
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        primary, fallback = self._with_kwargs()
+        config = {"callbacks": run_manager.get_child()}
+
+        return await self.breaker.call(
+            lambda: primary.ainvoke(query, config),
+            (lambda: fallback.ainvoke(query, config)) if fallback is not None else None,
+        )
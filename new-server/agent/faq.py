@@ -0,0 +1,123 @@
+"""Precomputed answers for frequently asked questions.
+
+The offline job in ``data/config/faq.py`` runs the agent over a curated list of
+common questions and stores each run's messages, including the retrieved
+sources. The graph serves a stored answer instead of running the agent when a
+new conversation opens with one of those questions.
+
+Stored answers carry a fingerprint of the system prompt and the corpus they were
+generated from, and are ignored once either changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, messages_from_dict
+
+from agent.utils import get_message_text
+
+SOURCES_DIR = "./data/sources"
+# How long the corpus fingerprint is trusted before it is recomputed, in seconds
+FINGERPRINT_TTL = 300
+
+_whitespace = re.compile(r"\s+")
+_punctuation = re.compile(r"[^\w\s]")
+
+_fingerprints: Dict[str, tuple[float, str]] = {}
+_answers: Dict[str, tuple[float, Dict[str, Any]]] = {}
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for matching: case, punctuation and whitespace."""
+    question = _punctuation.sub(" ", question.lower())
+    return _whitespace.sub(" ", question).strip()
+
+
+def compute_fingerprint(system_prompt: str, namespace: str) -> str:
+    """Fingerprint the inputs that determine an answer.
+
+    Args:
+        system_prompt (str): The unformatted system prompt.
+        namespace (str): The vector store namespace being served.
+
+    Returns:
+        str: A hex digest that changes when the prompt or corpus changes.
+    """
+    digest = hashlib.sha256()
+    digest.update(system_prompt.encode())
+    digest.update(namespace.encode())
+    if os.path.isdir(SOURCES_DIR):
+        for entry in sorted(os.scandir(SOURCES_DIR), key=lambda e: e.name):
+            stat = entry.stat()
+            digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def current_fingerprint(system_prompt: str, namespace: str) -> str:
+    """Return the fingerprint, recomputing it at most every FINGERPRINT_TTL seconds."""
+    key = f"{system_prompt}\x00{namespace}"
+    now = time.monotonic()
+    cached = _fingerprints.get(key)
+    if cached is None or now - cached[0] > FINGERPRINT_TTL:
+        cached = (now, compute_fingerprint(system_prompt, namespace))
+        _fingerprints[key] = cached
+    return cached[1]
+
+
+def load_answers(path: str) -> Dict[str, Any]:
+    """Load the answers file, reloading it when it changes on disk."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return {}
+
+    cached = _answers.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _answers[path] = cached
+    return cached[1]
+
+
+def opening_question(messages: Sequence[AnyMessage]) -> Optional[str]:
+    """Return the question if the conversation consists of a single question."""
+    if len(messages) != 1 or not isinstance(messages[0], HumanMessage):
+        return None
+    return get_message_text(messages[0])
+
+
+def lookup(
+    messages: Sequence[AnyMessage], path: str, system_prompt: str, namespace: str
+) -> Optional[List[AnyMessage]]:
+    """Find a stored answer for a new conversation.
+
+    Args:
+        messages (Sequence[AnyMessage]): The conversation so far.
+        path (str): The path of the answers file.
+        system_prompt (str): The unformatted system prompt in use.
+        namespace (str): The vector store namespace in use.
+
+    Returns:
+        Optional[List[AnyMessage]]: The stored tool calls, tool results and
+        final answer, or None if there is no fresh match.
+    """
+    question = opening_question(messages)
+    if question is None:
+        return None
+
+    answers = load_answers(path)
+    if not answers or answers.get("fingerprint") != current_fingerprint(
+        system_prompt, namespace
+    ):
+        return None
+
+    entry = answers.get("answers", {}).get(normalize_question(question))
+    if entry is None:
+        return None
+    return messages_from_dict(entry["messages"])
@@ -3,53 +3,117 @@
 Works with a chat model with tool calling support.
 """
 
+import asyncio
+import os
+import time
 from datetime import datetime, timezone
-from typing import Dict, List, Literal, cast
+from typing import Any, Dict, List, Literal, cast
 
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AnyMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
 
+from agent.checkpoint import SqliteCheckpointer
+from agent.coalesce import coalesced_model
 from agent.configuration import Configuration
+from agent.faq import lookup, opening_question
+from agent.index_version import active_version
+from agent.routing import select_model, step_metrics
+from agent.speculation import turn_key, turn_query
 from agent.state import InputState, State
-from agent.tools import TOOLS
+from agent.tools import TOOLS, prefetcher, search
 from agent.utils import load_chat_model
 
 # Define the function that calls the model
 
 
+async def _invoke_model(
+    model_name: str,
+    system_message: str,
+    state: State,
+    config: RunnableConfig,
+    configuration: Configuration,
+) -> AIMessage:
+    """Call a chat model with the tools bound on the conversation so far."""
+    # Initialize the model with tool binding. Change the model or add more tools here.
+    model = load_chat_model(model_name).bind_tools(TOOLS)
+
+    if configuration.coalesce_requests:
+        # Identical concurrent calls share one upstream request
+        shared_model = coalesced_model(
+            model,
+            model_name,
+            configuration.system_prompt,
+            system_message,
+            state.messages,
+        )
+        return cast(AIMessage, await shared_model.ainvoke(state.messages, config))
+    return cast(
+        AIMessage,
+        await model.ainvoke(
+            [{"role": "system", "content": system_message}, *state.messages],
+            config,
+        ),
+    )
+
+
 async def call_model(
     state: State, config: RunnableConfig
-) -> Dict[str, List[AIMessage]]:
+) -> Dict[str, List[Any]]:
     """Call the LLM powering our "agent".
 
     This function prepares the prompt, initializes the model, and processes the response.
+    With model routing enabled, tool selection goes to the planner model and answers
+    to the main model.
 
     Args:
         state (State): The current state of the conversation.
         config (RunnableConfig): Configuration for the model run.
 
     Returns:
-        dict: A dictionary containing the model's response message.
+        dict: A dictionary containing the model's response message and step metrics.
     """
     configuration = Configuration.from_runnable_config(config)
 
-    # Initialize the model with tool binding. Change the model or add more tools here.
-    model = load_chat_model(configuration.model).bind_tools(TOOLS)
-
     # Format the system prompt. Customize this to change the agent's behavior.
     system_message = configuration.system_prompt.format(
         system_time=datetime.now(tz=timezone.utc).isoformat()
     )
 
+    # Start searching for the user message while the model decides what to do
+    turn = turn_key(state.messages)
+    query = turn_query(state.messages)
+    if configuration.speculative_retrieval and turn and query:
+        prefetcher.start(turn, query, search(query, state.messages, configuration))
+
     # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages], config
-        ),
-    )
+    model_name, role = select_model(configuration, state.messages)
+    steps = []
+    started = time.perf_counter()
+    if role == "planner":
+        # Only the planner's tool calls are used, so don't stream its text
+        planner_config = {
+            **config,
+            "tags": [*config.get("tags", []), TAG_NOSTREAM],
+        }
+        response = await _invoke_model(
+            model_name, system_message, state, planner_config, configuration
+        )
+        steps.append(step_metrics(model_name, role, response, started, turn))
+        if not response.tool_calls:
+            # The planner answered directly; let the main model write the answer
+            model_name, role = configuration.model, "answer"
+            started = time.perf_counter()
+    if role == "answer":
+        response = await _invoke_model(
+            model_name, system_message, state, config, configuration
+        )
+        steps.append(step_metrics(model_name, role, response, started, turn))
+
+    if not response.tool_calls or state.is_last_step:
+        prefetcher.discard(turn)
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and response.tool_calls:
@@ -59,11 +123,41 @@ async def call_model(
                     id=response.id,
                     content="Sorry, I could not find an answer to your question in the specified number of steps.",
                 )
-            ]
+            ],
+            "steps": steps,
         }
 
     # Return the model's response as a list to be added to existing messages
-    return {"messages": [response]}
+    return {"messages": [response], "steps": steps}
+
+
+async def answer_from_faq(
+    state: State, config: RunnableConfig
+) -> Dict[str, List[AnyMessage]]:
+    """Answer a frequently asked question from the precomputed answers.
+
+    Every run starts here. Only a conversation that opens with a known question
+    gets the stored tool calls, tool results and answer; the lookup runs in a
+    worker thread, since it may read the answers file and stat the sources.
+
+    Args:
+        state (State): The current state of the conversation.
+        config (RunnableConfig): Configuration for the run.
+
+    Returns:
+        dict: A dictionary containing the stored messages, if any.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.faq_answers or opening_question(state.messages) is None:
+        return {"messages": []}
+    messages = await asyncio.to_thread(
+        lookup,
+        state.messages,
+        configuration.faq_path,
+        configuration.system_prompt,
+        active_version().namespace,
+    )
+    return {"messages": messages or []}
 
 
 # Define a new graph
@@ -73,10 +167,27 @@ builder = StateGraph(State, input=InputState, config_schema=Configuration)
 # Define the two nodes we will cycle between
 builder.add_node(call_model)
 builder.add_node("tools", ToolNode(TOOLS))
+builder.add_node(answer_from_faq)
 
-# Set the entrypoint as `call_model`
-# This means that this node is the first one called
-builder.add_edge("__start__", "call_model")
+
+def route_input(state: State) -> Literal["__end__", "call_model"]:
+    """End the run if answer_from_faq answered it, otherwise call the model.
+
+    Args:
+        state (State): The current state of the conversation.
+
+    Returns:
+        str: The name of the next node to call ("__end__" or "call_model").
+    """
+    last_message = state.messages[-1]
+    if isinstance(last_message, AIMessage) and not last_message.tool_calls:
+        return "__end__"
+    return "call_model"
+
+
+# Start with the precomputed answers; call the model unless one was served
+builder.add_edge("__start__", "answer_from_faq")
+builder.add_conditional_edges("answer_from_faq", route_input)
 
 
 def route_model_output(state: State) -> Literal["__end__", "tools"]:
@@ -114,9 +225,15 @@ builder.add_conditional_edges(
 # This creates a cycle: after using tools, we always return to the model
 builder.add_edge("tools", "call_model")
 
+# Persist conversations in a local SQLite database when AGENT_CHECKPOINT_DB is set.
+# The LangGraph server manages its own persistence, so this is for running the
+# graph directly (scripts, embedding it in another service).
+checkpoint_db = os.getenv("AGENT_CHECKPOINT_DB")
+
 # Compile the builder into an executable graph
 # You can customize this by adding interrupt points for state updates
 graph = builder.compile(
+    checkpointer=SqliteCheckpointer(checkpoint_db) if checkpoint_db else None,
     interrupt_before=[],  # Add node names here to update state before they're called
     interrupt_after=[],  # Add node names here to update state after they're called
 )
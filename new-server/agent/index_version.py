@@ -0,0 +1,105 @@
+"""Active index version, switched atomically by rewriting a pointer file.
+
+Each index build ingests into its own vector namespace and docstore directory.
+Once the build passes validation it is activated by replacing
+``data/vectorstore/active.json`` with ``os.replace``, so readers see either
+the old or the new version, never a half-written one. Running servers check
+the file's modification time and switch to the new version without a restart.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+
+POINTER_PATH = os.getenv("INDEX_POINTER_PATH", "./data/vectorstore/active.json")
+# Seconds between checks of the pointer file for a new version
+CHECK_INTERVAL = 5.0
+
+# Served until the first versioned build is activated
+LEGACY_VERSION = {"namespace": "v11", "docstore": "./data/vectorstore/kv"}
+
+
+@dataclass(frozen=True)
+class IndexVersion:
+    """A vector namespace and the docstore holding its parent documents.
+
+    ``fallback`` is the directory of the version's local fallback index, if
+    one was built.
+    """
+
+    namespace: str
+    docstore: str
+    fallback: Optional[str] = None
+
+
+_lock = threading.Lock()
+_active: Optional[Tuple[Optional[float], IndexVersion]] = None
+_checked = 0.0
+
+
+def _read_pointer(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"active": LEGACY_VERSION, "history": []}
+
+
+def _write_pointer(pointer: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def active_version(path: str = POINTER_PATH) -> IndexVersion:
+    """The currently active index version, re-read when the pointer changes."""
+    global _active, _checked
+    with _lock:
+        now = time.monotonic()
+        if _active is not None and now - _checked < CHECK_INTERVAL:
+            return _active[1]
+        _checked = now
+        try:
+            mtime: Optional[float] = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if _active is None or _active[0] != mtime:
+            _active = (mtime, IndexVersion(**_read_pointer(path)["active"]))
+        return _active[1]
+
+
+def versions(path: str = POINTER_PATH) -> List[IndexVersion]:
+    """Activated versions, most recent first, including the active one."""
+    pointer = _read_pointer(path)
+    return [IndexVersion(**pointer["active"])] + [
+        IndexVersion(**version) for version in pointer.get("history", [])
+    ]
+
+
+def activate(version: IndexVersion, path: str = POINTER_PATH) -> None:
+    """Atomically make ``version`` the active index."""
+    history = [v for v in versions(path) if v != version]
+    pointer = {
+        "active": asdict(version),
+        "history": [asdict(v) for v in history],
+        "activated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    _write_pointer(pointer, path)
+
+
+def forget(retired: List[IndexVersion], path: str = POINTER_PATH) -> None:
+    """Drop garbage-collected versions from the pointer's history."""
+    pointer = _read_pointer(path)
+    pointer["history"] = [
+        v for v in pointer.get("history", []) if IndexVersion(**v) not in retired
+    ]
+    _write_pointer(pointer, path)
@@ -0,0 +1,356 @@
+"""Bulk ingestion of parent/child chunks into the vectorstore and docstore.
+
+Loading the corpus one ``add_documents`` call at a time is slow, and a single
+failed request aborts the whole run. This engine instead:
+
+- splits documents into parents and children with deterministic ids, so
+  re-running an ingestion overwrites instead of duplicating;
+- drops near-duplicate parents and children before anything is embedded;
+- upserts children in large batches from a bounded pool of async workers, with
+  a bounded queue in front so splitting never runs far ahead of the upserts;
+- retries failed batches with exponential backoff and jitter, honoring the
+  server's Retry-After on rate limits;
+- records every finished batch in a checkpoint file, so an interrupted run
+  resumes where it stopped;
+- once every batch is in, embeds the children into a local fallback index
+  that serves retrieval while the remote index is unavailable;
+- prints progress and throughput while running and returns a report.
+
+The children carry their parent's id under ``doc_id``, matching
+ParentDocumentRetriever, so the result is served by the retriever tool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
+
+from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.stores import BaseStore
+from langchain_core.vectorstores import VectorStore
+from langchain_text_splitters import TextSplitter
+
+from agent.dedup import NearDuplicateIndex, deduplicate
+from agent.fallback import build_fallback_index, fallback_embeddings, is_current
+from agent.splitters import CHILD_CHUNK_SIZE, PARENT_CHUNK_SIZE, TranscriptSplitter
+
+# Metadata key linking a child chunk to its parent, as in ParentDocumentRetriever
+ID_KEY = "doc_id"
+SOURCES_DIR = "data/sources"
+
+
+@dataclass
+class IngestReport:
+    """Counts and timings of an ingestion run."""
+
+    parents: int = 0
+    children: int = 0
+    batches: int = 0
+    skipped_batches: int = 0
+    failed_batches: int = 0
+    retries: int = 0
+    duplicate_parents: int = 0
+    duplicate_children: int = 0
+    fallback_children: int = 0
+    seconds: float = 0.0
+    failures: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Children upserted per second."""
+        return self.children / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        fallback = (
+            f"; {self.fallback_children} chunks in the local fallback index"
+            if self.fallback_children
+            else ""
+        )
+        return (
+            f"{self.children} chunks from {self.parents} parents in "
+            f"{self.seconds:.1f}s ({self.throughput:.0f} chunks/s); "
+            f"{self.batches} batches, {self.skipped_batches} already done, "
+            f"{self.failed_batches} failed, {self.retries} retries; "
+            f"{self.duplicate_children} duplicate chunks and "
+            f"{self.duplicate_parents} duplicate parents dropped "
+            f"({self.duplicate_children} embeddings and vectors saved)"
+            f"{fallback}"
+        )
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def split_documents(
+    documents: Sequence[Document],
+    parent_splitter: TextSplitter,
+    child_splitter: TextSplitter,
+) -> Tuple[List[Tuple[str, Document]], List[Tuple[str, Document]]]:
+    """Split documents into (id, parent) and (id, child) pairs.
+
+    Ids are derived from the source and content, so they are stable across runs.
+    """
+    parents, children = [], []
+    for parent in parent_splitter.split_documents(documents):
+        source = str(parent.metadata.get("source", ""))
+        parent_id = _digest(source, parent.page_content)
+        parents.append((parent_id, parent))
+        for position, child in enumerate(child_splitter.split_documents([parent])):
+            child.metadata[ID_KEY] = parent_id
+            children.append((_digest(parent_id, str(position)), child))
+    return parents, children
+
+
+def load_corpus(
+    path: str = SOURCES_DIR,
+) -> Tuple[List[Tuple[str, Document]], List[Tuple[str, Document]]]:
+    """Load the testimonies and split them the way the retriever tool expects."""
+    documents = DirectoryLoader(path, glob="**/*.txt", loader_cls=TextLoader).load()
+    return split_documents(
+        documents,
+        parent_splitter=TranscriptSplitter(chunk_size=PARENT_CHUNK_SIZE),
+        child_splitter=TranscriptSplitter(chunk_size=CHILD_CHUNK_SIZE),
+    )
+
+
+class Checkpoint:
+    """Append-only record of finished batches, one batch key per line."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done: Set[str] = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def add(self, key: str) -> None:
+        self.done.add(key)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(key + "\n")
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait if the error is a rate limit, else None."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(response, "status_code", None)
+    if status != 429 and "rate limit" not in str(error).lower():
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0)) or None
+    except (TypeError, ValueError):
+        return None
+
+
+class IngestionEngine:
+    """Upsert chunks into a vectorstore from a bounded pool of async workers.
+
+    Args:
+        vectorstore: Target vectorstore for the child chunks.
+        docstore: Store for the parent documents, keyed by parent id.
+        batch_size: Children per upsert request.
+        concurrency: Upsert requests in flight at once.
+        max_retries: Attempts per batch before it is recorded as failed.
+        checkpoint_path: File recording finished batches, for resuming.
+        report_every: Seconds between progress lines.
+        dedup_threshold: Estimated similarity at which parents and children
+            are dropped as near-duplicates of an earlier one, or None to keep
+            everything.
+        fallback_path: Directory for the local fallback index, or None to
+            skip building it.
+        fallback_embeddings: Embedding model for the fallback index.
+    """
+
+    def __init__(
+        self,
+        vectorstore: VectorStore,
+        docstore: BaseStore[str, Document],
+        batch_size: int = 100,
+        concurrency: int = 8,
+        max_retries: int = 6,
+        checkpoint_path: Optional[str] = None,
+        report_every: float = 5.0,
+        dedup_threshold: Optional[float] = 0.9,
+        fallback_path: Optional[str] = None,
+        fallback_embeddings: Optional[Embeddings] = None,
+    ):
+        self.vectorstore = vectorstore
+        self.docstore = docstore
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.report_every = report_every
+        self.dedup_threshold = dedup_threshold
+        self.fallback_path = fallback_path
+        self.fallback_embeddings = fallback_embeddings
+
+    def _deduplicate(
+        self,
+        parents: Sequence[Tuple[str, Document]],
+        children: Sequence[Tuple[str, Document]],
+        report: IngestReport,
+    ) -> Tuple[List[Tuple[str, Document]], List[Tuple[str, Document]]]:
+        """Drop near-duplicate parents with their children, then duplicate children."""
+        kept_parents, duplicates = deduplicate(
+            [(parent_id, parent.page_content) for parent_id, parent in parents],
+            NearDuplicateIndex(self.dedup_threshold),
+        )
+        remaining = [
+            (child_id, child)
+            for child_id, child in children
+            if child.metadata.get(ID_KEY) not in duplicates
+        ]
+        kept_children, _ = deduplicate(
+            [(child_id, child.page_content) for child_id, child in remaining],
+            NearDuplicateIndex(self.dedup_threshold),
+        )
+
+        report.duplicate_parents = len(duplicates)
+        report.duplicate_children = len(children) - len(kept_children)
+        keep = set(kept_parents) | set(kept_children)
+        return (
+            [(key, doc) for key, doc in parents if key in keep],
+            [(key, doc) for key, doc in remaining if key in keep],
+        )
+
+    def _batches(
+        self, children: Sequence[Tuple[str, Document]]
+    ) -> Iterator[Tuple[str, List[Tuple[str, Document]]]]:
+        for start in range(0, len(children), self.batch_size):
+            batch = list(children[start : start + self.batch_size])
+            yield _digest(*(child_id for child_id, _ in batch)), batch
+
+    async def _upsert(
+        self, batch: List[Tuple[str, Document]], report: IngestReport
+    ) -> None:
+        ids = [child_id for child_id, _ in batch]
+        docs = [child for _, child in batch]
+        for attempt in range(self.max_retries):
+            try:
+                await self.vectorstore.aadd_documents(
+                    docs, ids=ids, batch_size=len(docs)
+                )
+                return
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                report.retries += 1
+                backoff = min(60.0, 2**attempt) * random.uniform(0.5, 1.5)
+                await asyncio.sleep(_retry_after(e) or backoff)
+
+    async def _worker(
+        self,
+        queue: "asyncio.Queue[Optional[Tuple[str, List[Tuple[str, Document]]]]]",
+        report: IngestReport,
+    ) -> None:
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                key, batch = item
+                try:
+                    await self._upsert(batch, report)
+                except Exception as e:
+                    report.failed_batches += 1
+                    report.failures.append(f"batch {key[:12]}: {e}")
+                    continue
+                self.checkpoint.add(key)
+                report.batches += 1
+                report.children += len(batch)
+            finally:
+                queue.task_done()
+
+    async def _report_progress(
+        self, report: IngestReport, total: int, start: float
+    ) -> None:
+        while True:
+            await asyncio.sleep(self.report_every)
+            elapsed = time.perf_counter() - start
+            rate = report.children / elapsed if elapsed else 0.0
+            remaining = total - report.children
+            eta = f"{remaining / rate:.0f}s" if rate else "?"
+            print(
+                f"[{report.children}/{total}] {rate:.0f} chunks/s, "
+                f"{report.retries} retries, {report.failed_batches} failed, eta {eta}"
+            )
+
+    async def aingest(
+        self,
+        parents: Sequence[Tuple[str, Document]],
+        children: Sequence[Tuple[str, Document]],
+    ) -> IngestReport:
+        """Store the parents and upsert the children, skipping finished batches."""
+        report = IngestReport()
+        start = time.perf_counter()
+
+        if self.dedup_threshold:
+            parents, children = self._deduplicate(parents, children, report)
+        report.parents = len(parents)
+
+        # Parents go to the local docstore first, so no child is ever
+        # searchable without its parent
+        await self.docstore.amset(list(parents))
+
+        pending = []
+        for key, batch in self._batches(children):
+            if key in self.checkpoint.done:
+                report.skipped_batches += 1
+            else:
+                pending.append((key, batch))
+        total = sum(len(batch) for _, batch in pending)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue, report))
+            for _ in range(self.concurrency)
+        ]
+        progress = asyncio.create_task(self._report_progress(report, total, start))
+        try:
+            for item in pending:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            progress.cancel()
+            for worker in workers:
+                worker.cancel()
+
+        # Only a complete run gets a fallback, so it never serves a partial corpus
+        if (
+            self.fallback_path
+            and not report.failed_batches
+            and not is_current(self.fallback_path, children)
+        ):
+            print(f"Building the local fallback index at {self.fallback_path}...")
+            await build_fallback_index(
+                children,
+                self.fallback_path,
+                self.fallback_embeddings or fallback_embeddings(),
+                id_key=ID_KEY,
+            )
+            report.fallback_children = len(children)
+
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def ingest(
+        self,
+        parents: Sequence[Tuple[str, Document]],
+        children: Sequence[Tuple[str, Document]],
+    ) -> IngestReport:
+        return asyncio.run(self.aingest(parents, children))
+
@@ -0,0 +1,225 @@
+"""In-process vector index with quantized storage and full-precision rescoring.
+
+A float32 index of 1536-dimensional embeddings needs 6 KB per chunk, which
+stops fitting in RAM once the corpus grows to thousands of testimonies. This
+index keeps a compact copy of each vector in memory for the first pass:
+
+- ``int8``: one byte per dimension with a per-vector scale (4x smaller).
+- ``binary``: one bit per dimension, compared by Hamming distance (32x smaller).
+
+Vectors can also be truncated to their first ``dims`` dimensions before
+quantization. This only works well for Matryoshka-trained models such as
+``text-embedding-3-small``/``-large``, not ``text-embedding-ada-002``.
+
+The full-precision vectors stay on disk in a memory-mapped file, and only the
+top ``k * rescore_factor`` candidates are read back to rescore them exactly.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+
+Quantization = Literal["none", "int8", "binary"]
+
+# Rows scored per block, which bounds the temporary float32 buffer
+_BLOCK = 65536
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+@dataclass
+class LocalVectorIndex:
+    """Cosine-similarity index over normalized embeddings.
+
+    Build one with ``from_vectors`` and persist it with ``save``; ``load`` maps
+    the full-precision vectors from disk instead of reading them into memory.
+    """
+
+    ids: List[str]
+    metadata: List[Dict[str, Any]]
+    full: np.ndarray
+    dims: int
+    quantization: Quantization = "int8"
+    codes: np.ndarray = field(default=None, repr=False)  # type: ignore[assignment]
+    scales: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.codes is None:
+            self.codes, self.scales = self._quantize(self.full)
+
+    @classmethod
+    def from_vectors(
+        cls,
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        ids: Sequence[str],
+        metadata: Optional[Sequence[Dict[str, Any]]] = None,
+        dims: Optional[int] = None,
+        quantization: Quantization = "int8",
+    ) -> "LocalVectorIndex":
+        """Create an index from raw embeddings.
+
+        Args:
+            vectors: Embeddings, one row per id.
+            ids: Identifier for each vector.
+            metadata: Optional metadata returned with each match.
+            dims: Keep only the first ``dims`` dimensions for the first pass.
+                Defaults to the full embedding size.
+            quantization: ``"none"``, ``"int8"`` or ``"binary"``.
+
+        Returns:
+            The in-memory index.
+        """
+        full = _normalize(np.asarray(vectors, dtype=np.float32))
+        if len(full) != len(ids):
+            raise ValueError(f"Got {len(full)} vectors for {len(ids)} ids")
+        return cls(
+            ids=list(ids),
+            metadata=list(metadata) if metadata is not None else [{} for _ in ids],
+            full=full,
+            dims=dims or full.shape[1],
+            quantization=quantization,
+        )
+
+    def _quantize(self, full: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        truncated = _normalize(full[:, : self.dims])
+        if self.quantization == "none":
+            return truncated.astype(np.float32), None
+        if self.quantization == "int8":
+            scales = np.abs(truncated).max(axis=1).astype(np.float32)
+            codes = np.round(truncated / np.maximum(scales, 1e-12)[:, None] * 127)
+            return codes.astype(np.int8), scales / 127
+        if self.quantization == "binary":
+            return np.packbits(truncated > 0, axis=1), None
+        raise ValueError(f"Unknown quantization: {self.quantization}")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held in memory for the first-pass search."""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        truncated = _normalize(query[: self.dims])
+        if self.quantization == "binary":
+            bits = np.packbits(truncated > 0)
+            scores = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), _BLOCK):
+                block = self.codes[start : start + _BLOCK]
+                distances = _POPCOUNT[block ^ bits].sum(axis=1, dtype=np.int32)
+                scores[start : start + len(block)] = -distances
+            return scores
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _BLOCK):
+            block = self.codes[start : start + _BLOCK].astype(np.float32)
+            scores[start : start + len(block)] = block @ truncated
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(
+        self, query: Sequence[float] | np.ndarray, k: int = 4, rescore_factor: int = 4
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Find the ``k`` vectors most similar to the query.
+
+        Args:
+            query: Query embedding at full dimensionality.
+            k: Number of matches to return.
+            rescore_factor: Candidates per match taken from the quantized pass
+                and rescored with the full-precision vectors. 0 disables
+                rescoring.
+
+        Returns:
+            (id, cosine similarity, metadata) tuples, best first. Without
+            rescoring the score is the approximate first-pass score.
+        """
+        if not len(self):
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        scores = self._coarse_scores(query)
+
+        n = min(len(self), max(k, k * rescore_factor))
+        candidates = np.argpartition(-scores, n - 1)[:n]
+        if rescore_factor:
+            # Sorted reads are sequential on the memory-mapped file
+            candidates.sort()
+            scores = np.asarray(self.full[candidates]) @ query
+        else:
+            scores = scores[candidates]
+
+        matches = []
+        for j in np.argsort(-scores)[:k]:
+            i = int(candidates[j])
+            matches.append((self.ids[i], float(scores[j]), self.metadata[i]))
+        return matches
+
+    def exact_search(
+        self, query: Sequence[float] | np.ndarray, k: int = 4
+    ) -> List[str]:
+        """Ids of the ``k`` nearest vectors by exact full-precision search."""
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _BLOCK):
+            block = np.asarray(self.full[start : start + _BLOCK])
+            scores[start : start + len(block)] = block @ query
+        return [self.ids[i] for i in np.argsort(-scores)[:k]]
+
+    def save(self, path: str) -> None:
+        """Write the index to a directory."""
+        os.makedirs(path, exist_ok=True)
+        full = np.memmap(
+            os.path.join(path, "vectors.f32"),
+            dtype=np.float32,
+            mode="w+",
+            shape=self.full.shape,
+        )
+        full[:] = self.full
+        full.flush()
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), self.scales)
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump(
+                {
+                    "dims": self.dims,
+                    "full_dims": self.full.shape[1],
+                    "quantization": self.quantization,
+                    "ids": self.ids,
+                    "metadata": self.metadata,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """Load an index written by ``save``, memory-mapping the full vectors."""
+        with open(os.path.join(path, "index.json")) as f:
+            info = json.load(f)
+        full = np.memmap(
+            os.path.join(path, "vectors.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(len(info["ids"]), info["full_dims"]),
+        )
+        scales_path = os.path.join(path, "scales.npy")
+        return cls(
+            ids=info["ids"],
+            metadata=info["metadata"],
+            full=full,
+            dims=info["dims"],
+            quantization=info["quantization"],
+            codes=np.load(os.path.join(path, "codes.npy")),
+            scales=np.load(scales_path) if os.path.exists(scales_path) else None,
+        )
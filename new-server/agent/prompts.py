@@ -26,3 +26,15 @@ Response Format:
 
 Remember, your role is to provide accurate and respectful answers based strictly on the data retrieved from your tools. Do not utilize any external knowledge or make assumptions beyond what the tools explicitly provide.
 """
+
+QUERY_REWRITE_PROMPT = """You rewrite search queries for a vector database of Holocaust survivor testimonies.
+
+Given the recent conversation and the latest search query, write {num_queries} standalone search queries that together capture what the user is asking for. Resolve pronouns and references ("her", "that camp", "after the war") using the conversation, keep names and places spelled exactly as they appear, and vary the wording so the queries match different passages.
+
+Return only the queries, one per line, with no numbering or commentary.
+
+Conversation:
+{conversation}
+
+Latest search query: {query}
+"""
@@ -0,0 +1,109 @@
+"""Cross-encoder reranking of retrieved documents.
+
+Vector similarity over small child chunks is a coarse signal, so the retriever
+over-fetches parent documents and a small quantized cross-encoder scores each
+(query, parent) pair on the CPU. Only the top results are sent to the LLM.
+
+Requires the optional ``rerank`` dependencies (``pip install zekher-api[rerank]``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.documents import Document
+
+# Scoring threads running at once. Threads outlive a timed-out request, so
+# requests that find no free slot skip reranking instead of queueing CPU work.
+RERANK_MAX_THREADS = int(os.getenv("RERANK_MAX_THREADS", str(os.cpu_count() or 1)))
+
+_encoders: Dict[str, Any] = {}
+_encoders_lock = threading.Lock()
+_scoring_slots = threading.BoundedSemaphore(RERANK_MAX_THREADS)
+_scoring_threads = ThreadPoolExecutor(RERANK_MAX_THREADS, thread_name_prefix="rerank")
+
+
+def _load_encoder(model_name: str) -> Any:
+    """Load a cross-encoder once per process and reuse it."""
+    with _encoders_lock:
+        if model_name not in _encoders:
+            try:
+                from fastembed.rerank.cross_encoder import TextCrossEncoder
+            except ImportError as e:
+                raise ImportError(
+                    "Reranking requires fastembed. "
+                    "Install it with `pip install zekher-api[rerank]`."
+                ) from e
+            _encoders[model_name] = TextCrossEncoder(model_name=model_name)
+        return _encoders[model_name]
+
+
+def _score(
+    encoder: Any, query: str, docs: Sequence[Document], batch_size: int
+) -> List[float]:
+    return list(
+        encoder.rerank(query, [doc.page_content for doc in docs], batch_size=batch_size)
+    )
+
+
+async def rerank(
+    query: str,
+    docs: Sequence[Document],
+    model: str,
+    top_n: int = 4,
+    batch_size: int = 32,
+    timeout: float = 1.0,
+) -> List[Document]:
+    """Reorder documents by cross-encoder relevance and keep the top results.
+
+    Scoring runs in a worker thread so it does not block the event loop. If it
+    fails, exceeds the latency budget or all scoring threads are busy, the
+    documents are returned in their original vector-similarity order instead.
+    Loading the model on first use is not counted against the budget.
+
+    Args:
+        query (str): The query to score documents against.
+        docs (Sequence[Document]): The candidate documents.
+        model (str): The name of the cross-encoder model.
+        top_n (int): The number of documents to keep.
+        batch_size (int): The number of pairs scored per batch.
+        timeout (float): The latency budget for scoring, in seconds.
+
+    Returns:
+        List[Document]: At most ``top_n`` documents, best first.
+    """
+    if len(docs) <= 1:
+        return list(docs)[:top_n]
+
+    try:
+        encoder = _encoders.get(model) or await asyncio.to_thread(_load_encoder, model)
+    except Exception as e:
+        print(f"Could not load the reranker: {e}")
+        return list(docs)[:top_n]
+
+    if not _scoring_slots.acquire(blocking=False):
+        print("All reranking threads are busy; using vector order")
+        return list(docs)[:top_n]
+    try:
+        job = _scoring_threads.submit(_score, encoder, query, docs, batch_size)
+    except Exception:
+        _scoring_slots.release()
+        raise
+    # Freed when scoring finishes, or when a job still queued at the timeout is
+    # cancelled and never runs
+    job.add_done_callback(lambda _: _scoring_slots.release())
+    try:
+        scores = await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+    except asyncio.TimeoutError:
+        print(f"Reranking exceeded {timeout}s budget; using vector order")
+        return list(docs)[:top_n]
+    except Exception as e:
+        print(f"Reranking failed: {e}")
+        return list(docs)[:top_n]
+
+    ranked = sorted(zip(scores, range(len(docs))), key=lambda x: x[0], reverse=True)
+    return [docs[i] for _, i in ranked[:top_n]]
@@ -0,0 +1,152 @@
+"""Query rewriting and multi-query retrieval.
+
+Follow-up questions such as "what happened to her after the war?" make poor
+vector search queries on their own. This module turns the conversation into a
+small set of standalone query variants, runs them against the retriever
+concurrently and merges the results.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langchain_core.retrievers import BaseRetriever
+
+from agent import prompts
+from agent.utils import get_message_text, load_chat_model
+
+# Number of conversation messages used as context for rewriting
+_CONTEXT_MESSAGES = 6
+# Maximum characters kept from each context message
+_CONTEXT_CHARS = 500
+# Context messages in the cache key; older turns rarely change the rewrite, and
+# keying on the whole conversation would miss on every new turn
+_KEY_MESSAGES = 2
+# Maximum number of cached rewrites
+_CACHE_SIZE = 1024
+
+_rewrite_cache: OrderedDict[str, List[str]] = OrderedDict()
+
+_numbering = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def _format_conversation(
+    messages: Sequence[AnyMessage], max_messages: int = _CONTEXT_MESSAGES
+) -> str:
+    """Render the last human and AI turns of a conversation as plain text."""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            role = "Assistant"
+        else:
+            continue
+        text = get_message_text(message)
+        if text:
+            lines.append(f"{role}: {text[:_CONTEXT_CHARS]}")
+    return "\n".join(lines[-max_messages:])
+
+
+def _parse_queries(text: str) -> List[str]:
+    """Split the model output into individual queries."""
+    queries = []
+    for line in text.splitlines():
+        line = _numbering.sub("", line).strip().strip('"')
+        if line:
+            queries.append(line)
+    return queries
+
+
+async def rewrite_queries(
+    query: str,
+    messages: Sequence[AnyMessage],
+    model: str,
+    num_queries: int = 3,
+) -> List[str]:
+    """Generate standalone variants of a retriever query.
+
+    The original query is always returned first. Rewrites are cached by model,
+    query and the last couple of messages, so repeated tool calls within a
+    conversation, or the same question in another one, do not pay for another
+    LLM round trip.
+
+    Args:
+        query (str): The query the agent passed to the retriever tool.
+        messages (Sequence[AnyMessage]): The conversation so far.
+        model (str): The rewrite model, in the form provider/model-name.
+        num_queries (int): The number of variants to generate.
+
+    Returns:
+        List[str]: The deduplicated list of queries to run.
+    """
+    conversation = _format_conversation(messages)
+    recent = _format_conversation(messages, _KEY_MESSAGES)
+    key = hashlib.sha256(
+        "\x00".join([model, str(num_queries), recent, query]).encode()
+    ).hexdigest()
+
+    if key in _rewrite_cache:
+        _rewrite_cache.move_to_end(key)
+        return _rewrite_cache[key]
+
+    prompt = prompts.QUERY_REWRITE_PROMPT.format(
+        num_queries=num_queries, conversation=conversation or "(none)", query=query
+    )
+    try:
+        response = await load_chat_model(model).ainvoke(prompt)
+        variants = _parse_queries(get_message_text(response))[:num_queries]
+    except Exception as e:
+        # Rewriting is an optimization; fall back to the original query
+        print(f"Query rewriting failed: {e}")
+        return [query]
+
+    queries = list(dict.fromkeys([query, *variants]))
+
+    _rewrite_cache[key] = queries
+    if len(_rewrite_cache) > _CACHE_SIZE:
+        _rewrite_cache.popitem(last=False)
+
+    return queries
+
+
+async def multi_query_retrieve(
+    retriever: BaseRetriever, queries: Sequence[str], limit: Optional[int] = None
+) -> List[Document]:
+    """Run several queries concurrently and merge the results.
+
+    Results are interleaved so that the best match for every query comes before
+    the second-best match of any query, and documents returned by more than one
+    query are only kept once.
+
+    Args:
+        retriever (BaseRetriever): The retriever to query.
+        queries (Sequence[str]): The queries to run.
+        limit (Optional[int]): The maximum number of documents returned, so
+            extra query variants don't multiply the prompt size.
+
+    Returns:
+        List[Document]: The merged, deduplicated documents.
+    """
+    results = await asyncio.gather(*(retriever.ainvoke(q) for q in queries))
+
+    merged: List[Document] = []
+    seen = set()
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            digest = hashlib.sha1(doc.page_content.encode()).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            merged.append(doc)
+
+    return merged[:limit]
@@ -0,0 +1,149 @@
+"""In-process cache of retriever results.
+
+The same retriever queries recur across users and across the iterations of a
+ReAct loop, and each costs a vector search plus docstore reads. Results are
+cached by normalized query text, ``k``, filter and index version, in an LRU
+with a TTL. A new index version gets new keys, and the cache is cleared when
+the servers switch to it, so stale results are never served.
+
+Empty results, and results fetched while the circuit breaker was not closed
+or answered by the local fallback index (see ``agent/fallback.py``), are not
+cached, so they stop being served as soon as the remote index recovers.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from agent.breaker import Watch, watch
+from agent.faq import normalize_question
+from agent.index_version import IndexVersion
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+# Seconds a result is served from the cache
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+
+CacheKey = Tuple[str, str, str, int, str]
+
+
+class RetrievalCache:
+    """Thread-safe LRU of document lists with a TTL."""
+
+    def __init__(
+        self, max_entries: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[Document]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        version: IndexVersion, query: str, k: int, filter: Optional[Any] = None
+    ) -> CacheKey:
+        return (
+            version.namespace,
+            version.docstore,
+            normalize_question(query),
+            k,
+            json.dumps(filter, sort_keys=True, default=str),
+        )
+
+    def get(self, key: CacheKey) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def set(self, key: CacheKey, docs: List[Document]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, list(docs))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CachedRetriever(BaseRetriever):
+    """Serve ``retriever``'s results for an index version from ``cache``.
+
+    ``search_kwargs`` is passed on to the wrapped retriever (e.g. a larger
+    ``k`` for reranking) and is part of the cache key.
+    """
+
+    retriever: BaseRetriever
+    cache: RetrievalCache
+    version: IndexVersion
+    search_kwargs: Dict[str, Any] = {}
+
+    def _target(self) -> Tuple[BaseRetriever, Dict[str, Any]]:
+        retriever = self.retriever
+        if self.search_kwargs:
+            retriever = retriever.model_copy(
+                update={"search_kwargs": {**self.search_kwargs}}
+            )
+        search_kwargs = getattr(retriever, "search_kwargs", {})
+        return retriever, search_kwargs
+
+    def _key(self, query: str, search_kwargs: Dict[str, Any]) -> CacheKey:
+        return RetrievalCache.key(
+            self.version, query, search_kwargs.get("k", 4), search_kwargs.get("filter")
+        )
+
+    def _store(self, key: CacheKey, docs: List[Document], calls: Watch) -> None:
+        if docs and not calls.degraded:
+            self.cache.set(key, docs)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        retriever, search_kwargs = self._target()
+        key = self._key(query, search_kwargs)
+        docs = self.cache.get(key)
+        if docs is None:
+            with watch() as calls:
+                docs = retriever.invoke(query, {"callbacks": run_manager.get_child()})
+            self._store(key, docs, calls)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        retriever, search_kwargs = self._target()
+        key = self._key(query, search_kwargs)
+        docs = self.cache.get(key)
+        if docs is None:
+            with watch() as calls:
+                docs = await retriever.ainvoke(
+                    query, {"callbacks": run_manager.get_child()}
+                )
+            self._store(key, docs, calls)
+        return docs
@@ -0,0 +1,87 @@
+"""Tiered model routing and per-step metrics.
+
+Most agent steps only decide which tool to call, which a small model does as
+well as a large one. With routing enabled, steps that have not seen tool
+results yet go to a fast planner model, and the strong model only writes
+answers. If the planner answers directly instead of calling a tool, its answer
+is discarded and the strong model answers, so every answer the user sees comes
+from the strong model.
+
+Every model call is recorded as a step with its model, latency, token usage
+and estimated cost.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Literal, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from agent.configuration import Configuration
+
+Role = Literal["planner", "answer"]
+
+# USD per million input and output tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "claude-3-5-sonnet-latest": (3.00, 15.00),
+    "claude-3-5-haiku-latest": (0.80, 4.00),
+}
+
+
+def estimate_cost(model: str, response: AIMessage) -> Optional[float]:
+    """Estimated cost of a model call in USD, if the model's price is known."""
+    prices = MODEL_PRICES.get(model.split("/", maxsplit=1)[-1])
+    usage = response.usage_metadata
+    if prices is None or not usage:
+        return None
+    return (
+        usage["input_tokens"] * prices[0] + usage["output_tokens"] * prices[1]
+    ) / 1_000_000
+
+
+def select_model(
+    configuration: Configuration, messages: Sequence[AnyMessage]
+) -> Tuple[str, Role]:
+    """Pick the model for the next step.
+
+    Returns the planner model until the current turn has tool results, and the
+    answer model after that or when routing is disabled.
+    """
+    if not configuration.model_routing:
+        return configuration.model, "answer"
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            return configuration.model, "answer"
+        if isinstance(message, HumanMessage):
+            break
+    return configuration.planner_model, "planner"
+
+
+def step_metrics(
+    model: str,
+    role: Role,
+    response: AIMessage,
+    started: float,
+    turn: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Record of one model call, from its response and perf_counter start time.
+
+    ``turn`` is the id of the human message being answered; see ``State.steps``.
+    """
+    usage = response.usage_metadata or {}
+    return {
+        "turn": turn,
+        "model": model,
+        "role": role,
+        "latency_ms": round((time.perf_counter() - started) * 1000),
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "cost_usd": estimate_cost(model, response),
+        "tool_calls": [call["name"] for call in response.tool_calls],
+    }
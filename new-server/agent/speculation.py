@@ -0,0 +1,121 @@
+"""Speculative retrieval started alongside the first model call of a turn.
+
+On most turns the model's first step is a retriever call with roughly the
+user's question, so retrieval only starts after a full LLM round trip. With
+speculative retrieval enabled, the search for the raw user message runs while
+the model is still deciding. If the query in its tool call is close enough to
+the user message, the tool awaits the prefetched results instead of searching
+again; otherwise the prefetch is discarded.
+
+Prefetches are keyed by the id of the human message that started the turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Awaitable, Generic, Optional, Sequence, Set, TypeVar
+
+from langchain_core.messages import AnyMessage, HumanMessage
+
+from agent.utils import get_message_text
+
+T = TypeVar("T")
+
+# Maximum number of prefetches kept while waiting for their tool call
+_MAX_PENDING = 256
+
+_word = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have how in is it "
+    "its of on or she he that the their them they this to was were what when "
+    "where which who whom why with you your tell me about".split()
+)
+
+
+def _terms(text: str) -> Set[str]:
+    return {
+        word
+        for word in _word.findall(text.lower())
+        if len(word) > 1 and word not in _STOPWORDS
+    }
+
+
+def query_overlap(query: str, prefetched: str) -> float:
+    """Share of the query's terms that also appear in the prefetched query.
+
+    The tool query is usually a condensed version of the user message, so
+    this measures how much of what the model asked for the prefetch covers.
+    """
+    terms = _terms(query)
+    if not terms:
+        return 0.0
+    return len(terms & _terms(prefetched)) / len(terms)
+
+
+def turn_key(messages: Sequence[AnyMessage]) -> Optional[str]:
+    """Key of the current turn: the id of the latest human message."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.id
+    return None
+
+
+def turn_query(messages: Sequence[AnyMessage]) -> Optional[str]:
+    """The user message to search for, if the model is about to take its first step."""
+    if messages and isinstance(messages[-1], HumanMessage):
+        return get_message_text(messages[-1]).strip() or None
+    return None
+
+
+class Prefetcher(Generic[T]):
+    """In-flight speculative searches, claimed at most once by the tool."""
+
+    def __init__(self, max_pending: int = _MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._pending: OrderedDict[str, tuple[str, asyncio.Task]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, key: str, query: str, search: Awaitable[T]) -> None:
+        """Run ``search`` for ``query`` in the background under ``key``."""
+        self.discard(key)
+        task = asyncio.ensure_future(search)
+        # The result may never be claimed; don't warn about unretrieved errors
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._pending[key] = (query, task)
+        while len(self._pending) > self.max_pending:
+            _, (_, oldest) = self._pending.popitem(last=False)
+            oldest.cancel()
+
+    def discard(self, key: Optional[str]) -> None:
+        """Cancel the prefetch for ``key``, if any."""
+        if key is None:
+            return
+        entry = self._pending.pop(key, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def claim(
+        self, key: Optional[str], query: str, threshold: float
+    ) -> Optional[T]:
+        """Prefetched results if they match ``query`` closely enough, else None.
+
+        A prefetch is claimed at most once; a mismatch discards it.
+        """
+        if key is None or key not in self._pending:
+            return None
+        prefetched, task = self._pending.pop(key)
+        if query_overlap(query, prefetched) < threshold:
+            task.cancel()
+            self.misses += 1
+            return None
+        try:
+            result = await task
+        except Exception as e:
+            print(f"Speculative retrieval failed: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
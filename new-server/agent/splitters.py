@@ -0,0 +1,195 @@
+"""Transcript-aware splitting of the testimony sources.
+
+The Boder interviews are transcripts of alternating speaker turns, each usually
+preceded by a ``[hh:mm:ss]`` timestamp line::
+
+    [00:00:44]
+    Hadassah Marcus: My name is Hadassah Marcus, born in Warsaw...
+
+Character-based splitting cuts answers in half and separates them from the
+question they answer. This splitter parses the turns in a single pass, groups
+each interviewer question with the answer that follows it, and packs whole
+question/answer pairs into chunks. Timestamps are removed from the text and
+kept as ``start_time``/``end_time`` metadata instead.
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+_TIMESTAMP = re.compile(r"^\[(\d{1,2}:\d{2}:\d{2})\]\s*(.*)$")
+# "DAVID BODER: ...", "Hadassah Marcus: ...": up to four capitalized words
+_SPEAKER = re.compile(r"^([A-ZÀ-Þ][\w’'.\-]*(?: [A-ZÀ-Þ][\w’'.\-]*){0,3}):\s")
+_BEGIN = "TRANSCRIPTION BEGIN"
+
+# Sizes used for the parent documents and the embedded child chunks
+PARENT_CHUNK_SIZE = 2000
+CHILD_CHUNK_SIZE = 800
+
+
+@dataclass
+class _Turn:
+    speaker: str
+    timestamp: Optional[str]
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def _parse(text: str) -> Tuple[str, List[_Turn]]:
+    """Split a transcript into its header and speaker turns."""
+    header: List[str] = []
+    turns: List[_Turn] = []
+    timestamp = None
+    # Aviary exports have a metadata header ("Media File: ...") before this line
+    in_header = _BEGIN in text
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if in_header:
+            if line == _BEGIN:
+                in_header = False
+            else:
+                header.append(line)
+            continue
+        match = _TIMESTAMP.match(line)
+        if match:
+            timestamp, line = match.group(1), match.group(2)
+            if not line:
+                continue
+        match = _SPEAKER.match(line)
+        if match:
+            turns.append(_Turn(match.group(1), timestamp, [line]))
+            timestamp = None
+        elif turns:
+            turns[-1].lines.append(line)
+        else:
+            header.append(line)
+    return "\n".join(header), turns
+
+
+class TranscriptSplitter(TextSplitter):
+    """Split interview transcripts on speaker turns, keeping Q/A pairs together.
+
+    Chunks are packed from whole question/answer pairs up to ``chunk_size``.
+    A pair that is too long on its own is split between turns, and a single
+    turn that is too long falls back to recursive character splitting. Texts
+    without speaker turns are split recursively as well.
+
+    Args:
+        chunk_size: Maximum chunk length.
+        chunk_overlap: Overlap used only by the recursive fallback.
+        interviewer: Pattern matching the interviewer's speaker label. If no
+            speaker matches, the first speaker is taken as the interviewer.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 0,
+        interviewer: str = r"boder",
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._interviewer = re.compile(interviewer, re.IGNORECASE)
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=self._length_function,
+        )
+
+    def _pairs(self, turns: List[_Turn]) -> List[List[_Turn]]:
+        """Group turns into question/answer pairs."""
+        interviewers = {t.speaker for t in turns if self._interviewer.search(t.speaker)}
+        if not interviewers:
+            interviewers = {turns[0].speaker}
+
+        pairs: List[List[_Turn]] = []
+        answered = True
+        for turn in turns:
+            asking = turn.speaker in interviewers
+            # A new question after an answer starts a new pair
+            if not pairs or (asking and answered):
+                pairs.append([])
+            pairs[-1].append(turn)
+            answered = not asking
+        return pairs
+
+    def _pack(self, turns: List[_Turn]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """Pack whole turns into chunks, splitting turns only if they are too long."""
+        current: List[_Turn] = []
+        length = 0
+        for turn in turns:
+            size = self._length_function(turn.text)
+            if size > self._chunk_size:
+                if current:
+                    yield self._chunk(current)
+                    current, length = [], 0
+                for piece in self._fallback.split_text(turn.text):
+                    yield piece, self._metadata([turn])
+                continue
+            if current and length + size + 2 > self._chunk_size:
+                yield self._chunk(current)
+                current, length = [], 0
+            current.append(turn)
+            length += size + 2
+        if current:
+            yield self._chunk(current)
+
+    def _chunk(self, turns: List[_Turn]) -> Tuple[str, Dict[str, Any]]:
+        return "\n\n".join(t.text for t in turns), self._metadata(turns)
+
+    @staticmethod
+    def _metadata(turns: List[_Turn]) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        timestamps = [t.timestamp for t in turns if t.timestamp]
+        if timestamps:
+            metadata["start_time"] = timestamps[0]
+            metadata["end_time"] = timestamps[-1]
+        metadata["speakers"] = ", ".join(dict.fromkeys(t.speaker for t in turns))
+        return metadata
+
+    def _split(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        header, turns = _parse(text)
+        if not turns:
+            return [(chunk, {}) for chunk in self._fallback.split_text(text)]
+
+        chunks = [(chunk, {}) for chunk in self._fallback.split_text(header)]
+        pending: List[_Turn] = []
+        pending_length = 0
+        for pair in self._pairs(turns):
+            size = sum(self._length_function(t.text) + 2 for t in pair)
+            if pending and pending_length + size > self._chunk_size:
+                chunks.extend(self._pack(pending))
+                pending, pending_length = [], 0
+            if size > self._chunk_size:
+                # Too long to keep together: split this pair between its turns
+                chunks.extend(self._pack(pair))
+                continue
+            pending.extend(pair)
+            pending_length += size
+        chunks.extend(self._pack(pending))
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self._split(text)]
+
+    def create_documents(
+        self, texts: List[str], metadatas: Optional[List[dict]] = None
+    ) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            for chunk, extra in self._split(text):
+                chunk_metadata = {**copy.deepcopy(metadata), **extra}
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Sequence
+from typing import Any, Dict, List, Sequence
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
@@ -11,6 +11,19 @@ from langgraph.managed import IsLastStep
 from typing_extensions import Annotated
 
 
+def add_turn_steps(
+    left: List[Dict[str, Any]], right: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Append step metrics, starting over when they belong to a new turn.
+
+    Each step records the id of the human message it answered under "turn",
+    so the checkpointed list only ever holds the current turn's steps.
+    """
+    if right and left and right[0].get("turn") != left[-1].get("turn"):
+        return list(right)
+    return left + right
+
+
 @dataclass
 class InputState:
     """Defines the input state for the agent, representing a narrower interface to the outside world.
@@ -53,6 +66,15 @@ class State(InputState):
     It is set to 'True' when the step count reaches recursion_limit - 1.
     """
 
+    steps: Annotated[List[Dict[str, Any]], add_turn_steps] = field(
+        default_factory=list
+    )
+    """
+    Metrics of the current turn's model calls: turn (the id of the human message),
+    model, role ("planner" or "answer"), latency_ms, input_tokens, output_tokens,
+    cost_usd and the names of the tools it called.
+    """
+
     # Additional attributes can be added here as needed.
     # Common examples include:
     # retrieved_documents: List[Document] = field(default_factory=list)
@@ -0,0 +1,119 @@
+"""Shared clients and stores used by the retrieval tools.
+
+The vector index clients are created once per process so every vectorstore
+reuses the same HTTP connection pool, and parent documents are read through an
+in-memory cache so hot documents are served without touching the filesystem
+or a worker thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+from langchain.storage import LocalFileStore
+from upstash_vector import AsyncIndex, Index
+
+# Parent documents kept in memory, in bytes
+DOCSTORE_CACHE_BYTES = int(os.getenv("DOCSTORE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+_index: Optional[Index] = None
+_async_index: Optional[AsyncIndex] = None
+
+
+def vector_indexes() -> Tuple[Index, AsyncIndex]:
+    """Return the process-wide Upstash Vector clients, created from the env."""
+    global _index, _async_index
+    if _index is None:
+        _index = Index.from_env()
+        _async_index = AsyncIndex.from_env()
+    return _index, _async_index  # type: ignore[return-value]
+
+
+class CachedFileStore(LocalFileStore):
+    """LocalFileStore with an in-memory LRU cache and batched async reads.
+
+    ``amget`` answers cached keys directly on the event loop and reads all
+    missing keys in a single worker-thread hop, instead of one blocking read
+    per document. Writes and deletes through the store keep the cache in sync.
+    """
+
+    def __init__(
+        self, root_path: Union[str, Path], max_bytes: int = DOCSTORE_CACHE_BYTES
+    ) -> None:
+        super().__init__(root_path)
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _cached(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            values = []
+            for key in keys:
+                value = self._cache.get(key)
+                if value is not None:
+                    self._cache.move_to_end(key)
+                values.append(value)
+            return values
+
+    def _remember(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._cache[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _forget(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            for key in keys:
+                old = self._cache.pop(key, None)
+                if old is not None:
+                    self._size -= len(old)
+
+    def _read(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = super().mget(keys)
+        for key, value in zip(keys, values):
+            if value is not None:
+                self._remember(key, value)
+        return values
+
+    @staticmethod
+    def _merge(
+        values: List[Optional[bytes]], read: List[Optional[bytes]]
+    ) -> List[Optional[bytes]]:
+        """Fill the cache misses in ``values`` with the values read from disk."""
+        found = iter(read)
+        return [value if value is not None else next(found) for value in values]
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = self._cached(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+        return self._merge(values, self._read(missing))
+
+    async def amget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = self._cached(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+        return self._merge(values, await asyncio.to_thread(self._read, missing))
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        super().mset(key_value_pairs)
+        self._forget([key for key, _ in key_value_pairs])
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        super().mdelete(keys)
+        self._forget(keys)
@@ -6,11 +6,14 @@ These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
 """
 
-from typing import Any, Callable, List, Optional, cast
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, cast
 
 from dotenv import load_dotenv
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_community.vectorstores import UpstashVectorStore
+from langchain_core.documents import Document
+from langchain_core.messages import AnyMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import InjectedToolArg, create_retriever_tool
 from langchain_openai import OpenAIEmbeddings
@@ -19,39 +22,157 @@ from langchain.retrievers import MultiVectorRetriever
 from langchain.storage import InMemoryByteStore
 
 from langchain.retrievers import ParentDocumentRetriever
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.storage import LocalFileStore
+from langgraph.prebuilt import InjectedState
 from langchain.storage._lc_store import create_kv_docstore
 
+from agent.breaker import CircuitBreaker
 from agent.configuration import Configuration
+from agent.fallback import LocalFallbackRetriever, ResilientRetriever, fallback_embeddings
+from agent.index_version import IndexVersion, active_version
+from agent.rerank import rerank
+from agent.retrieval import multi_query_retrieve, rewrite_queries
+from agent.retrieval_cache import CachedRetriever, RetrievalCache
+from agent.speculation import Prefetcher, turn_key
+from agent.splitters import (
+    CHILD_CHUNK_SIZE,
+    PARENT_CHUNK_SIZE,
+    TranscriptSplitter,
+)
+from agent.stores import CachedFileStore, vector_indexes
 
 load_dotenv()
 
 # TODO: Figure out if configuration is needed
 # configuration = Configuration.from_runnable_config(config)
 
-vectorstore = UpstashVectorStore(namespace="v11", embedding=True)
-parent_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-child_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
+# Queries go through the shared AsyncIndex, so retrieval never blocks the loop
+index, async_index = vector_indexes()
+# Split on speaker turns so questions stay with their answers
+parent_splitter = TranscriptSplitter(chunk_size=PARENT_CHUNK_SIZE)
+child_splitter = TranscriptSplitter(chunk_size=CHILD_CHUNK_SIZE)
 
-fs = LocalFileStore("./data/vectorstore/kv")
-store = create_kv_docstore(fs)
+_retrievers: Dict[IndexVersion, CachedRetriever] = {}
+# Bounds the time spent waiting on Upstash; see agent/breaker.py
+vector_breaker = CircuitBreaker("upstash-vector")
+retrieval_cache = RetrievalCache()
 
-# Step 6: Initialize the ParentDocumentRetriever with the correct configuration
-print("Setting up retriever...")
-retriever = ParentDocumentRetriever(
-    vectorstore=vectorstore,
-    docstore=store,
-    child_splitter=child_splitter,
-    parent_splitter=parent_splitter,  # This is crucial for proper functioning
-)
 
+def build_retriever(version: IndexVersion) -> ParentDocumentRetriever:
+    """Create a ParentDocumentRetriever over one index version."""
+    print(f"Setting up retriever for namespace {version.namespace}...")
+    vectorstore = UpstashVectorStore(
+        index=index,
+        async_index=async_index,
+        namespace=version.namespace,
+        embedding=True,
+    )
+    return ParentDocumentRetriever(
+        vectorstore=vectorstore,
+        docstore=create_kv_docstore(CachedFileStore(version.docstore)),
+        child_splitter=child_splitter,
+        parent_splitter=parent_splitter,  # This is crucial for proper functioning
+    )
 
-retriever_tool = create_retriever_tool(
-    retriever,
-    "retriever",
-    "Use this tool to answer questions about specific individuals or themes in the context of the Holocaust. You must use this tool if you are asked about a specific individual in the context of the Holocaust. Return your answer in plaintext; no XML, markdown, or other formatting is necessary.",
-)
+
+def resilient_retriever(version: IndexVersion) -> ResilientRetriever:
+    """Wrap a version's retriever in the breaker, with its local fallback if built."""
+    primary = build_retriever(version)
+    fallback = None
+    if version.fallback and os.path.exists(version.fallback):
+        fallback = LocalFallbackRetriever(
+            path=version.fallback,
+            docstore=primary.docstore,
+            embeddings=fallback_embeddings(),
+        )
+    else:
+        print(f"No local fallback index for namespace {version.namespace}")
+    return ResilientRetriever(primary=primary, fallback=fallback, breaker=vector_breaker)
+
+
+def current_retriever() -> CachedRetriever:
+    """The cached retriever for the active index version.
+
+    Picks up a newly activated version without a restart; the previous
+    version's retriever, docstore cache and cached results are dropped.
+    """
+    version = active_version()
+    if version not in _retrievers:
+        _retrievers.clear()
+        retrieval_cache.clear()
+        _retrievers[version] = CachedRetriever(
+            retriever=resilient_retriever(version),
+            cache=retrieval_cache,
+            version=version,
+        )
+    return _retrievers[version]
+
+
+current_retriever()
+
+
+async def search(
+    query: str, messages: Sequence[AnyMessage], configuration: Configuration
+) -> List[Document]:
+    """Retrieve documents for a query from the active index version."""
+    queries = [query]
+    if configuration.query_rewriting:
+        queries = await rewrite_queries(
+            query,
+            messages,
+            model=configuration.query_rewrite_model,
+            num_queries=configuration.num_query_variants,
+        )
+
+    parent_retriever = current_retriever()
+    base_retriever = parent_retriever
+    if configuration.rerank:
+        # Over-fetch so the cross-encoder has candidates to choose from
+        base_retriever = parent_retriever.model_copy(
+            update={"search_kwargs": {"k": configuration.rerank_candidates}}
+        )
+
+    # As many documents as a single query returns (4 by default), or the
+    # reranker's candidates
+    limit = (
+        configuration.rerank_candidates
+        if configuration.rerank
+        else base_retriever.search_kwargs.get("k", 4)
+    )
+    docs = await multi_query_retrieve(base_retriever, queries, limit)
+
+    if configuration.rerank:
+        docs = await rerank(
+            query,
+            docs,
+            model=configuration.rerank_model,
+            top_n=configuration.rerank_top_n,
+            batch_size=configuration.rerank_batch_size,
+            timeout=configuration.rerank_timeout,
+        )
+    return docs
+
+
+# Searches started for the user message while the first model call runs
+prefetcher: Prefetcher[List[Document]] = Prefetcher()
+
+
+async def retriever(
+    query: str,
+    messages: Annotated[Sequence[AnyMessage], InjectedState("messages")],
+    *,
+    config: Annotated[RunnableConfig, InjectedToolArg],
+) -> str:
+    """Use this tool to answer questions about specific individuals or themes in the context of the Holocaust. You must use this tool if you are asked about a specific individual in the context of the Holocaust. Return your answer in plaintext; no XML, markdown, or other formatting is necessary."""
+    configuration = Configuration.from_runnable_config(config)
+
+    docs = None
+    if configuration.speculative_retrieval:
+        docs = await prefetcher.claim(
+            turn_key(messages), query, configuration.speculative_match_threshold
+        )
+    if docs is None:
+        docs = await search(query, messages, configuration)
+    return "\n\n".join(doc.page_content for doc in docs)
 
 
-TOOLS: List[Callable[..., Any]] = [retriever_tool]
+TOOLS: List[Callable[..., Any]] = [retriever]
@@ -0,0 +1,25 @@
+"""Custom HTTP routes served alongside the LangGraph API.
+
+Registered under ``http.app`` in langgraph.json.
+"""
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from agent.tools import prefetcher, retrieval_cache, vector_breaker
+
+
+async def retrieval_metrics(request: Request) -> JSONResponse:
+    """Vector store breaker state and latency, and cache and prefetch hit counts."""
+    return JSONResponse(
+        {
+            "vector_store": vector_breaker.metrics(),
+            "cache": retrieval_cache.metrics(),
+            "prefetch": {"hits": prefetcher.hits, "misses": prefetcher.misses},
+        }
+    )
+
+
+app = Starlette(routes=[Route("/metrics/retrieval", retrieval_metrics)])
@@ -0,0 +1,209 @@
+"""Build a new index version, validate it and switch the servers over to it.
+
+Steps:
+    1. Ingest data/sources into a fresh namespace and docstore directory,
+       while the servers keep serving the active version.
+    2. Wait until the vector index has finished indexing the new namespace.
+    3. Run the smoke questions in data/eval/questions.jsonl against the new
+       version and compare its recall with the active version.
+    4. Atomically point data/vectorstore/active.json at the new version.
+       Running servers pick it up within a few seconds.
+    5. Delete versions beyond the newest --keep ones (namespace, docstore and
+       local fallback index).
+
+Step 1 also embeds the chunks into a local fallback index, which the servers
+search while the remote vector index is slow or unreachable.
+
+If ingestion fails, re-run with the printed --namespace to resume it.
+
+Usage:
+    python data/config/build_index.py
+    python data/config/build_index.py --namespace idx-20250101-120000   # resume
+    python data/config/build_index.py --activate v11                    # roll back
+    python data/config/build_index.py --drop v2,v10                     # remove legacy namespaces
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+
+from dotenv import load_dotenv
+from langchain_community.vectorstores import UpstashVectorStore
+from langchain.storage._lc_store import create_kv_docstore
+
+from agent.fallback import fallback_path
+from agent.index_version import IndexVersion, activate, active_version, forget, versions
+from agent.ingest import IngestionEngine, load_corpus
+from agent.stores import CachedFileStore, vector_indexes
+from agent.tools import build_retriever
+
+# Load environment variables
+load_dotenv()
+
+QUESTIONS_PATH = "data/eval/questions.jsonl"
+# Namespaces served by the old server, which must never be dropped
+PROTECTED_NAMESPACES = {"full", "split"}
+
+
+def new_version(namespace=None):
+    namespace = namespace or time.strftime("idx-%Y%m%d-%H%M%S")
+    return IndexVersion(
+        namespace=namespace,
+        docstore=f"./data/vectorstore/kv-{namespace}",
+        fallback=fallback_path(namespace),
+    )
+
+
+def ingest(version, batch_size, concurrency, dedup_threshold):
+    index, async_index = vector_indexes()
+    os.makedirs("data/vectorstore", exist_ok=True)
+    parents, children = load_corpus()
+    print(f"Ingesting {len(children)} chunks into namespace {version.namespace}...")
+    engine = IngestionEngine(
+        vectorstore=UpstashVectorStore(
+            index=index,
+            async_index=async_index,
+            namespace=version.namespace,
+            embedding=True,
+        ),
+        docstore=create_kv_docstore(CachedFileStore(version.docstore)),
+        batch_size=batch_size,
+        concurrency=concurrency,
+        checkpoint_path=f"data/vectorstore/ingest-{version.namespace}.checkpoint",
+        dedup_threshold=dedup_threshold or None,
+        fallback_path=version.fallback,
+    )
+    report = engine.ingest(parents, children)
+    print(report.summary())
+    return report, len(children) - report.duplicate_children
+
+
+def wait_until_indexed(namespace, expected, timeout):
+    """Wait for the namespace to hold all vectors with none pending."""
+    index, _ = vector_indexes()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = index.info().namespaces.get(namespace)
+        if info and info.pending_vector_count == 0 and info.vector_count >= expected:
+            return True
+        time.sleep(2)
+    return False
+
+
+async def smoke_recall(version, labels):
+    """Share of smoke questions whose labeled evidence is retrieved."""
+    retriever = build_retriever(version)
+    results = await asyncio.gather(
+        *[retriever.ainvoke(label["question"]) for label in labels]
+    )
+    hits = 0
+    for label, docs in zip(labels, results):
+        evidence = label["evidence"].lower()
+        hits += any(
+            os.path.basename(doc.metadata.get("source", "")) == label["source"]
+            and evidence in doc.page_content.lower()
+            for doc in docs
+        )
+    return hits / len(labels)
+
+
+def drop(version):
+    index, _ = vector_indexes()
+    if (
+        version.namespace in PROTECTED_NAMESPACES
+        or version.namespace == active_version().namespace
+    ):
+        print(f"Refusing to drop namespace {version.namespace}, which is in use")
+        return
+    print(f"Dropping namespace {version.namespace} and {version.docstore}")
+    try:
+        index.delete_namespace(version.namespace)
+    except Exception as e:
+        print(f"Could not delete namespace {version.namespace}: {e}")
+    shutil.rmtree(version.docstore, ignore_errors=True)
+    if version.fallback:
+        shutil.rmtree(version.fallback, ignore_errors=True)
+    checkpoint = f"data/vectorstore/ingest-{version.namespace}.checkpoint"
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+def collect_garbage(keep):
+    retired = versions()[keep:]
+    for version in retired:
+        drop(version)
+    forget(retired)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--namespace", help="namespace to build or resume")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="similarity at which chunks are dropped as duplicates; 0 keeps all",
+    )
+    parser.add_argument("--min-recall", type=float, default=0.6)
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="largest allowed recall drop against the active version",
+    )
+    parser.add_argument("--index-timeout", type=float, default=600)
+    parser.add_argument("--keep", type=int, default=2, help="versions to keep")
+    parser.add_argument("--force", action="store_true", help="skip validation")
+    parser.add_argument("--activate", help="switch to an already built namespace")
+    parser.add_argument("--drop", help="comma-separated unmanaged namespaces to delete")
+    args = parser.parse_args()
+
+    if args.drop:
+        for namespace in args.drop.split(","):
+            drop(new_version(namespace))
+        return
+
+    if args.activate:
+        matches = [v for v in versions() if v.namespace == args.activate]
+        if not matches:
+            print(f"Unknown version {args.activate}")
+            exit(1)
+        activate(matches[0])
+        print(f"Activated {args.activate}")
+        return
+
+    version = new_version(args.namespace)
+    report, expected = ingest(
+        version, args.batch_size, args.concurrency, args.dedup_threshold
+    )
+    if report.failed_batches:
+        print(f"Ingestion incomplete. Resume with --namespace {version.namespace}")
+        exit(1)
+
+    if not wait_until_indexed(version.namespace, expected, args.index_timeout):
+        print(f"Namespace {version.namespace} is still indexing; not activating.")
+        print(f"Resume with --namespace {version.namespace}")
+        exit(1)
+
+    if not args.force:
+        with open(QUESTIONS_PATH) as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+        recall = asyncio.run(smoke_recall(version, labels))
+        baseline = asyncio.run(smoke_recall(active_version(), labels))
+        print(f"Smoke recall: {recall:.2f} (active version: {baseline:.2f})")
+        if recall < args.min_recall or recall < baseline - args.max_regression:
+            print(f"Validation failed; {version.namespace} was not activated.")
+            exit(1)
+
+    activate(version)
+    print(f"Activated {version.namespace}")
+    collect_garbage(args.keep)
+
+
+if __name__ == "__main__":
+    main()
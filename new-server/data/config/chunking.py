@@ -0,0 +1,213 @@
+"""Benchmark parent/child splitter configurations on the labeled question set.
+
+For each configuration the sources in data/sources are split into parent and
+child chunks, the children are embedded into an in-memory index, and each
+question in data/eval/questions.jsonl is answered the way ParentDocumentRetriever
+does it: the top-k children are looked up and their parents returned.
+
+Reported per configuration:
+    recall          share of questions whose retrieved parents come from the
+                    labeled source and contain the labeled evidence
+    context tokens  mean tokens of retrieved parents sent to the model
+    ingest s        seconds to split and embed the corpus
+    vectors / MB    child vectors and approximate index + docstore size
+
+The best configuration (highest recall, then fewest context tokens) is printed
+and written as JSON.
+
+Configurations are "parent size/overlap:child size/overlap" for the recursive
+character splitter, or "T<parent size>:<child size>" for TranscriptSplitter.
+
+Usage:
+    python data/config/chunking.py
+    python data/config/chunking.py --configs 2000/200:400/50,T2000:800
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import tiktoken
+from dotenv import load_dotenv
+from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agent.local_index import LocalVectorIndex
+from agent.splitters import TranscriptSplitter
+
+# Load environment variables
+load_dotenv()
+
+SPLITTERS = {
+    "recursive": RecursiveCharacterTextSplitter,
+    "transcript": TranscriptSplitter,
+}
+
+QUESTIONS_PATH = "data/eval/questions.jsonl"
+OUTPUT_PATH = "data/eval/chunking.json"
+
+# parent size/overlap : child size/overlap. Includes the settings currently
+# used by ingestion.py (2000/0:400/0) and tools.py (2000/200:400/50).
+DEFAULT_CONFIGS = (
+    "1000/100:200/25,1000/100:400/50,"
+    "2000/0:400/0,2000/200:400/50,2000/200:200/25,2000/200:800/100,"
+    "4000/400:400/50,4000/400:800/100,"
+    "T2000:800,T2000:400,T4000:800"
+)
+
+
+def parse_configs(spec):
+    configs = []
+    for item in spec.split(","):
+        if item.startswith("T"):
+            parent, child = item[1:].split(":")
+            configs.append(
+                {
+                    "splitter": "transcript",
+                    "parent_chunk_size": int(parent),
+                    "parent_chunk_overlap": 0,
+                    "child_chunk_size": int(child),
+                    "child_chunk_overlap": 0,
+                }
+            )
+            continue
+        parent, child = item.split(":")
+        parent_size, parent_overlap = (int(x) for x in parent.split("/"))
+        child_size, child_overlap = (int(x) for x in child.split("/"))
+        configs.append(
+            {
+                "splitter": "recursive",
+                "parent_chunk_size": parent_size,
+                "parent_chunk_overlap": parent_overlap,
+                "child_chunk_size": child_size,
+                "child_chunk_overlap": child_overlap,
+            }
+        )
+    return configs
+
+
+def build(docs, config, embeddings):
+    """Split and embed the corpus. Returns (index, parents, children, seconds)."""
+    start = time.perf_counter()
+    splitter = SPLITTERS[config["splitter"]]
+    parent_splitter = splitter(
+        chunk_size=config["parent_chunk_size"],
+        chunk_overlap=config["parent_chunk_overlap"],
+    )
+    child_splitter = splitter(
+        chunk_size=config["child_chunk_size"],
+        chunk_overlap=config["child_chunk_overlap"],
+    )
+
+    parents = parent_splitter.split_documents(docs)
+    children, metadata = [], []
+    for parent_id, parent in enumerate(parents):
+        for child in child_splitter.split_text(parent.page_content):
+            children.append(child)
+            metadata.append({"parent": parent_id})
+
+    vectors = embeddings.embed_documents(children)
+    index = LocalVectorIndex.from_vectors(
+        vectors, [str(i) for i in range(len(children))], metadata, quantization="none"
+    )
+    return index, parents, children, time.perf_counter() - start
+
+
+def retrieve_parents(index, parents, query_vector, k):
+    """Top-k children, deduplicated to their parents in rank order."""
+    seen = []
+    for _, _, metadata in index.search(query_vector, k, rescore_factor=0):
+        if metadata["parent"] not in seen:
+            seen.append(metadata["parent"])
+    return [parents[i] for i in seen]
+
+
+def is_hit(docs, label):
+    evidence = label["evidence"].lower()
+    return any(
+        os.path.basename(doc.metadata.get("source", "")) == label["source"]
+        and evidence in doc.page_content.lower()
+        for doc in docs
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS)
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--k", type=int, default=4, help="child chunks retrieved")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    loader = DirectoryLoader("data/sources", glob="**/*.txt", loader_cls=TextLoader)
+    docs = loader.load()
+    with open(args.questions) as f:
+        labels = [json.loads(line) for line in f if line.strip()]
+
+    embeddings = OpenAIEmbeddings(model=args.model)
+    encoding = tiktoken.get_encoding("cl100k_base")
+    query_vectors = embeddings.embed_documents([label["question"] for label in labels])
+    print(f"{len(docs)} documents, {len(labels)} labeled questions, k={args.k}\n")
+    print(
+        f"{'config':<22}{'recall':>8}{'context tokens':>16}"
+        f"{'ingest s':>10}{'vectors':>9}{'MB':>7}"
+    )
+
+    results = []
+    for config in parse_configs(args.configs):
+        index, parents, children, seconds = build(docs, config, embeddings)
+
+        hits, tokens = 0, []
+        for label, query_vector in zip(labels, query_vectors):
+            retrieved = retrieve_parents(index, parents, query_vector, args.k)
+            hits += is_hit(retrieved, label)
+            tokens.append(
+                len(encoding.encode("\n\n".join(d.page_content for d in retrieved)))
+            )
+
+        size = (
+            index.full.nbytes
+            + sum(len(child.encode()) for child in children)
+            + sum(len(parent.page_content.encode()) for parent in parents)
+        )
+        result = {
+            **config,
+            "recall": hits / len(labels),
+            "context_tokens": statistics.mean(tokens),
+            "ingest_seconds": round(seconds, 2),
+            "vectors": len(children),
+            "index_bytes": size,
+        }
+        results.append(result)
+
+        name = (
+            f"{config['parent_chunk_size']}/{config['parent_chunk_overlap']}:"
+            f"{config['child_chunk_size']}/{config['child_chunk_overlap']}"
+        )
+        if config["splitter"] == "transcript":
+            name = f"T{config['parent_chunk_size']}:{config['child_chunk_size']}"
+        print(
+            f"{name:<22}{result['recall']:>8.2f}{result['context_tokens']:>16.0f}"
+            f"{seconds:>10.1f}{len(children):>9}{size / 2**20:>7.1f}"
+        )
+
+    best = max(results, key=lambda r: (r["recall"], -r["context_tokens"]))
+    print("\nBest configuration:")
+    print(json.dumps(best, indent=2))
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(
+            {"model": args.model, "k": args.k, "best": best, "results": results},
+            f,
+            indent=2,
+        )
+    print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Precompute answers for the curated FAQ list.
+
+Runs the agent over every question in data/faq/questions.txt and stores the
+resulting messages (tool calls, retrieved sources and final answer) in
+data/faq/answers.json, which the graph serves on a normalized match.
+
+Usage:
+    # Add the most frequent logged production questions to the curated list
+    python data/config/faq.py --seed questions.log --top 50
+
+    # Rebuild only if the corpus or system prompt changed (suitable for cron)
+    python data/config/faq.py --if-stale
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, messages_to_dict
+
+from agent import prompts
+from agent.faq import compute_fingerprint, load_answers, normalize_question
+from agent.graph import graph
+from agent.index_version import active_version
+
+# Load environment variables
+load_dotenv()
+
+QUESTIONS_PATH = "data/faq/questions.txt"
+ANSWERS_PATH = "data/faq/answers.json"
+
+
+def read_questions(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def seed_questions(log_path, top):
+    """Add the most frequent logged questions to the curated list."""
+    with open(log_path) as f:
+        logged = [line.strip() for line in f if line.strip()]
+
+    counts = Counter(normalize_question(q) for q in logged)
+    originals = {}
+    for question in logged:
+        originals.setdefault(normalize_question(question), question)
+
+    existing = read_questions(QUESTIONS_PATH) if os.path.exists(QUESTIONS_PATH) else []
+    known = {normalize_question(q) for q in existing}
+    added = [
+        originals[q] for q, _ in counts.most_common() if q not in known
+    ][:top]
+
+    with open(QUESTIONS_PATH, "a") as f:
+        for question in added:
+            f.write(question + "\n")
+    print(f"Added {len(added)} logged questions to {QUESTIONS_PATH}")
+
+
+async def answer(question, semaphore):
+    async with semaphore:
+        # Don't serve stale answers to ourselves or share calls with live traffic
+        result = await graph.ainvoke(
+            {"messages": [HumanMessage(content=question)]},
+            {"configurable": {"faq_answers": False, "coalesce_requests": False}},
+        )
+    # Drop the question itself and the per-run message ids
+    messages = messages_to_dict(result["messages"][1:])
+    for message in messages:
+        message["data"]["id"] = None
+    return question, messages
+
+
+async def build(concurrency):
+    questions = read_questions(QUESTIONS_PATH)
+    print(f"Answering {len(questions)} questions...")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    answers = {}
+    for task in asyncio.as_completed([answer(q, semaphore) for q in questions]):
+        try:
+            question, messages = await task
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            continue
+        answers[normalize_question(question)] = {
+            "question": question,
+            "messages": messages,
+        }
+        print(f"[{len(answers)}/{len(questions)}] {question}")
+
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", help="file of logged questions, one per line")
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--if-stale", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(ANSWERS_PATH), exist_ok=True)
+
+    if args.seed:
+        seed_questions(args.seed, args.top)
+
+    namespace = active_version().namespace
+    fingerprint = compute_fingerprint(prompts.SYSTEM_PROMPT, namespace)
+    if args.if_stale:
+        existing = load_answers(ANSWERS_PATH)
+        questions = {normalize_question(q) for q in read_questions(QUESTIONS_PATH)}
+        if existing.get("fingerprint") == fingerprint and questions == set(
+            existing.get("answers", {})
+        ):
+            print("Answers are up to date.")
+            return
+
+    answers = asyncio.run(build(args.concurrency))
+
+    # Write to a temporary file first so the server never reads a partial file
+    tmp_path = ANSWERS_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "answers": answers}, f)
+    os.replace(tmp_path, ANSWERS_PATH)
+    print(f"Stored {len(answers)} answers in {ANSWERS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Ingest data/sources into a vectorstore namespace and the parent docstore.
+
+Splits the testimonies with the transcript splitter used by the retriever tool
+and upserts the child chunks in parallel batches. Progress is checkpointed per
+namespace, so re-running the same command after a failure resumes the run.
+
+To build, validate and switch to a new index version in one step, use
+data/config/build_index.py instead.
+
+Usage:
+    python data/config/ingest.py --namespace v12
+    python data/config/ingest.py --namespace v12 --restart   # ignore the checkpoint
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+from langchain_community.vectorstores import UpstashVectorStore
+from langchain.storage._lc_store import create_kv_docstore
+
+from agent.ingest import IngestionEngine, load_corpus
+from agent.stores import CachedFileStore, vector_indexes
+
+# Load environment variables
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--namespace", required=True)
+    parser.add_argument("--docstore", help="defaults to data/vectorstore/kv-<namespace>")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="similarity at which chunks are dropped as duplicates; 0 keeps all",
+    )
+    parser.add_argument(
+        "--fallback", help="also build a local fallback index in this directory"
+    )
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    checkpoint_path = f"data/vectorstore/ingest-{args.namespace}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    os.makedirs("data/vectorstore", exist_ok=True)
+
+    print("Loading documents...")
+    parents, children = load_corpus()
+    print(f"Split the sources into {len(parents)} parents and {len(children)} chunks")
+
+    index, async_index = vector_indexes()
+    engine = IngestionEngine(
+        vectorstore=UpstashVectorStore(
+            index=index,
+            async_index=async_index,
+            namespace=args.namespace,
+            embedding=True,
+        ),
+        docstore=create_kv_docstore(
+            CachedFileStore(args.docstore or f"./data/vectorstore/kv-{args.namespace}")
+        ),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=checkpoint_path,
+        dedup_threshold=args.dedup_threshold or None,
+        fallback_path=args.fallback,
+    )
+    report = engine.ingest(parents, children)
+
+    print(report.summary())
+    for failure in report.failures:
+        print(f"  {failure}")
+    if report.failed_batches:
+        print("Re-run the same command to retry the failed batches.")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,13 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 from langchain_community.vectorstores import UpstashVectorStore
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain.retrievers import ParentDocumentRetriever
 from langchain.storage import LocalFileStore
 from langchain.storage._lc_store import create_kv_docstore
 
+from agent.splitters import TranscriptSplitter
+
 # Load environment variables
 load_dotenv()
 
@@ -26,8 +27,9 @@ if len(docs) == 0:
 os.makedirs("data/vectorstore", exist_ok=True)
 
 # Step 3: Initialize text splitters for parent and child documents
-parent_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-child_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
+# Split on speaker turns so questions stay with their answers
+parent_splitter = TranscriptSplitter(chunk_size=2000)
+child_splitter = TranscriptSplitter(chunk_size=800)
 
 # Step 4: Initialize vector store
 print("Initializing vector store...")
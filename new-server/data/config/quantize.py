@@ -0,0 +1,114 @@
+"""Report recall and memory of quantized variants of the local vector index.
+
+Embeds the child chunks of data/sources, split exactly as ingestion splits
+them for the retriever tool, then compares every combination of truncated
+dimensions and quantization against exact float32 search, with and without
+full-precision rescoring. The queries are the curated FAQ questions unless
+--queries is given.
+
+The local fallback index itself is built by ingestion (data/config/ingest.py
+--fallback), since it must reference the parents in the version's docstore.
+
+Usage:
+    python data/config/quantize.py --dims 1536,512,256
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+
+from agent.fallback import FALLBACK_EMBEDDING_MODEL
+from agent.ingest import load_corpus
+from agent.local_index import LocalVectorIndex
+
+# Load environment variables
+load_dotenv()
+
+EMBEDDINGS_PATH = "data/vectorstore/quantize_embeddings.npy"
+# Chunk ids of the cached embeddings, one per row
+EMBEDDING_IDS_PATH = "data/vectorstore/quantize_embeddings.json"
+
+
+def embed_chunks(ids, chunks, embeddings, refresh):
+    """Embed the chunks, reusing the previous run's vectors if the ids match."""
+    if not refresh and os.path.exists(EMBEDDING_IDS_PATH):
+        with open(EMBEDDING_IDS_PATH) as f:
+            if json.load(f) == ids:
+                return np.load(EMBEDDINGS_PATH)
+    print(f"Embedding {len(chunks)} chunks...")
+    vectors = np.asarray(
+        embeddings.embed_documents([chunk.page_content for chunk in chunks]),
+        dtype=np.float32,
+    )
+    np.save(EMBEDDINGS_PATH, vectors)
+    with open(EMBEDDING_IDS_PATH, "w") as f:
+        json.dump(ids, f)
+    return vectors
+
+
+def evaluate(index, baseline, queries, k, rescore_factor):
+    recalls, latencies = [], []
+    for query in queries:
+        expected = set(baseline.exact_search(query, k))
+        start = time.perf_counter()
+        found = index.search(query, k, rescore_factor=rescore_factor)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & {id for id, _, _ in found}) / k)
+    return statistics.mean(recalls), statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=FALLBACK_EMBEDDING_MODEL)
+    parser.add_argument("--queries", default="data/faq/questions.txt")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", default="1536,768,512,256")
+    parser.add_argument("--quantization", default="none,int8,binary")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--refresh", action="store_true", help="re-embed the chunks")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(EMBEDDINGS_PATH), exist_ok=True)
+    embeddings = OpenAIEmbeddings(model=args.model)
+
+    _, children = load_corpus()
+    ids = [child_id for child_id, _ in children]
+    chunks = [child for _, child in children]
+    vectors = embed_chunks(ids, chunks, embeddings, args.refresh)
+
+    with open(args.queries) as f:
+        questions = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    queries = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+
+    baseline = LocalVectorIndex.from_vectors(vectors, ids, quantization="none")
+    full_bytes = baseline.memory_bytes
+    print(f"{len(chunks)} chunks, {len(questions)} queries, recall@{args.k}\n")
+    print(f"{'variant':<16}{'memory':>10}{'ratio':>8}{'recall':>9}{'rescored':>10}{'ms':>7}")
+
+    for quantization in args.quantization.split(","):
+        for dims in (int(d) for d in args.dims.split(",")):
+            if dims > vectors.shape[1]:
+                continue
+            index = LocalVectorIndex.from_vectors(
+                vectors, ids, dims=dims, quantization=quantization
+            )
+            recall, _ = evaluate(index, baseline, queries, args.k, 0)
+            rescored, ms = evaluate(
+                index, baseline, queries, args.k, args.rescore_factor
+            )
+            print(
+                f"{quantization + ':' + str(dims):<16}"
+                f"{index.memory_bytes / 2**20:>8.1f}MB"
+                f"{full_bytes / index.memory_bytes:>7.1f}x"
+                f"{recall:>9.3f}{rescored:>10.3f}{ms:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
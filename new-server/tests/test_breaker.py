@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from agent.breaker import CircuitBreaker
+
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", timeout=1.0, hedge_after=1.0, cooldown=0.0)
+    breaker._transition("open")
+    return breaker
+
+
+async def _hang() -> None:
+    await asyncio.Event().wait()
+
+
+async def _answer() -> str:
+    return "primary"
+
+
+async def _fallback() -> str:
+    return "fallback"
+
+
+def test_cancelled_probe_reopens_the_breaker():
+    async def scenario() -> None:
+        breaker = _open_breaker()
+        probe = asyncio.ensure_future(breaker.call(_hang, _fallback))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state == "open"
+        assert breaker.counts["failures"] == 1
+
+        # After the cooldown the next call probes again and can close the breaker
+        assert await breaker.call(_answer, _fallback) == "primary"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_call_while_closed_is_not_a_failure():
+    async def scenario() -> None:
+        breaker = CircuitBreaker("test", timeout=1.0, hedge_after=1.0)
+        call = asyncio.ensure_future(breaker.call(_hang, _fallback))
+        await asyncio.sleep(0.01)
+
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert breaker.state == "closed"
+        assert breaker.counts["failures"] == 0
+
+    asyncio.run(scenario())
+
+
+def _unavailable() -> str:
+    raise RuntimeError("unavailable")
+
+
+def test_sync_calls_open_the_breaker_and_fall_back():
+    breaker = CircuitBreaker("test", min_calls=2)
+    assert breaker.call_sync(_unavailable, lambda: "fallback") == "fallback"
+    assert breaker.call_sync(_unavailable, lambda: "fallback") == "fallback"
+    assert breaker.state == "open"
+
+    calls = []
+    assert breaker.call_sync(lambda: calls.append(1), lambda: "fallback") == "fallback"
+    assert calls == []
+    assert breaker.counts["rejected"] == 1
+
+
+def test_sync_probe_closes_the_breaker():
+    breaker = _open_breaker()
+    assert breaker.call_sync(lambda: "primary", lambda: "fallback") == "primary"
+    assert breaker.state == "closed"
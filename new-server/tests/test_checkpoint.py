@@ -0,0 +1,78 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import MessagesState, StateGraph
+
+from agent.checkpoint import SqliteCheckpointer
+
+
+def _graph(checkpointer):
+    def reply(state: MessagesState):
+        question = state["messages"][-1].content
+        return {"messages": [AIMessage(content=f"echo: {question}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", reply)
+    builder.add_edge("__start__", "reply")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id="t1"):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _count(checkpointer, table, thread_id="t1"):
+    return checkpointer.conn.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)
+    ).fetchone()[0]
+
+
+def _ask(graph, turns, thread_id="t1"):
+    for turn in range(turns):
+        question = HumanMessage(content=f"q{turn}")
+        graph.invoke({"messages": [question]}, _config(thread_id))
+
+
+def test_restores_the_conversation_from_disk(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    _ask(_graph(SqliteCheckpointer(path)), 3)
+
+    state = _graph(SqliteCheckpointer(path)).get_state(_config())
+    assert [m.content for m in state.values["messages"]] == [
+        "q0", "echo: q0", "q1", "echo: q1", "q2", "echo: q2",
+    ]
+
+
+def test_messages_are_stored_once_per_thread(tmp_path):
+    checkpointer = SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    _ask(_graph(checkpointer), 3)
+    assert _count(checkpointer, "messages") == 6
+
+
+def test_compaction_keeps_the_latest_state(tmp_path):
+    checkpointer = SqliteCheckpointer(
+        str(tmp_path / "checkpoints.sqlite"), keep_last=2, compact_every=3
+    )
+    graph = _graph(checkpointer)
+    _ask(graph, 5)
+    _ask(graph, 1, thread_id="t2")
+
+    # keep_last, plus the puts since the last compaction
+    assert _count(checkpointer, "checkpoints") <= 2 + 3 - 1
+    assert _count(checkpointer, "messages") == 10
+    state = graph.get_state(_config())
+    assert len(state.values["messages"]) == 10
+    assert state.values["messages"][-1].content == "echo: q4"
+    # Other threads are untouched
+    assert len(graph.get_state(_config("t2")).values["messages"]) == 2
+
+
+def test_missing_messages_raise_instead_of_truncating(tmp_path):
+    checkpointer = SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    graph = _graph(checkpointer)
+    _ask(graph, 2)
+    checkpointer.conn.execute(
+        "DELETE FROM messages WHERE digest = (SELECT MIN(digest) FROM messages)"
+    )
+
+    with pytest.raises(ValueError, match="missing messages"):
+        graph.get_state(_config())
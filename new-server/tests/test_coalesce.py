@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from agent.coalesce import SingleFlight
+
+
+class Source:
+    """A stream that yields one item each time ``step`` is set."""
+
+    def __init__(self, items, error=None):
+        self.items = items
+        self.error = error
+        self.step = asyncio.Event()
+        self.started = 0
+
+    async def stream(self):
+        self.started += 1
+        for item in self.items:
+            await self.step.wait()
+            self.step.clear()
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+async def _emit(source, times=1):
+    for _ in range(times):
+        source.step.set()
+        while source.step.is_set():
+            await asyncio.sleep(0)
+
+
+def test_callers_share_one_stream_from_the_start():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source(["a", "b"])
+        leader = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await _emit(source)
+
+        # A caller arriving after the first item still receives it
+        follower = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await _emit(source)
+
+        assert await leader == ["a", "b"]
+        assert await follower == ["a", "b"]
+        assert source.started == 1
+        assert "q" not in flights
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source(["a"], error=RuntimeError("model failed"))
+        callers = [
+            asyncio.create_task(_collect(flights.stream("q", source.stream)))
+            for _ in range(2)
+        ]
+        await _emit(source)
+
+        for caller in callers:
+            with pytest.raises(RuntimeError, match="model failed"):
+                await caller
+        assert "q" not in flights
+
+        # The key is free again, so the next caller starts a new stream
+        retry = Source(["b"])
+        caller = asyncio.create_task(_collect(flights.stream("q", retry.stream)))
+        await _emit(retry)
+        assert await caller == ["b"]
+
+    asyncio.run(scenario())
+
+
+def test_stream_finishes_after_the_first_caller_goes_away():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source(["a", "b"])
+        leader = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        follower = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await _emit(source)
+
+        leader.cancel()
+        await _emit(source)
+        assert await follower == ["a", "b"]
+        assert source.started == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from agent import rerank as rerank_module
+from agent.rerank import rerank
+
+DOCS = [Document(page_content=text) for text in ["first", "second", "third"]]
+
+
+class _SlowEncoder:
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+
+    def rerank(self, query, texts, batch_size):
+        time.sleep(self.seconds)
+        return [float(i) for i in range(len(texts))]
+
+
+def _free_slots() -> int:
+    return rerank_module._scoring_slots._value
+
+
+def test_scores_reorder_documents():
+    rerank_module._encoders["fast"] = _SlowEncoder(0)
+    docs = asyncio.run(rerank("query", DOCS, model="fast", top_n=2))
+    assert [doc.page_content for doc in docs] == ["third", "second"]
+    assert _free_slots() == rerank_module.RERANK_MAX_THREADS
+
+
+def test_timed_out_jobs_free_their_slots():
+    rerank_module._encoders["slow"] = _SlowEncoder(0.2)
+    # Occupy every scoring thread so later jobs are still queued at their timeout
+    blocker = threading.Event()
+    busy = [
+        rerank_module._scoring_threads.submit(blocker.wait)
+        for _ in range(rerank_module.RERANK_MAX_THREADS)
+    ]
+
+    docs = asyncio.run(rerank("query", DOCS, model="slow", timeout=0.05))
+    assert docs == DOCS[:4]
+
+    blocker.set()
+    for future in busy:
+        future.result()
+    assert _free_slots() == rerank_module.RERANK_MAX_THREADS
@@ -0,0 +1,53 @@
+import asyncio
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from agent.breaker import CircuitBreaker
+from agent.fallback import ResilientRetriever
+from agent.index_version import IndexVersion
+from agent.retrieval_cache import CachedRetriever, RetrievalCache
+
+DOCS = [Document(page_content="testimony")]
+
+
+class _StaticRetriever(BaseRetriever):
+    docs: List[Document] = []
+    fail: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        if self.fail:
+            raise RuntimeError("unavailable")
+        return self.docs
+
+
+def _cached_entries(primary: BaseRetriever, breaker: CircuitBreaker) -> int:
+    cache = RetrievalCache()
+    retriever = CachedRetriever(
+        retriever=ResilientRetriever(
+            primary=primary, fallback=_StaticRetriever(docs=DOCS), breaker=breaker
+        ),
+        cache=cache,
+        version=IndexVersion(namespace="test", docstore="test"),
+    )
+    asyncio.run(retriever.ainvoke("query"))
+    return len(cache._entries)
+
+
+def test_caches_results_from_the_primary():
+    assert _cached_entries(_StaticRetriever(docs=DOCS), CircuitBreaker("test")) == 1
+
+
+def test_does_not_cache_empty_results():
+    assert _cached_entries(_StaticRetriever(), CircuitBreaker("test")) == 0
+
+
+def test_does_not_cache_fallback_results():
+    assert _cached_entries(_StaticRetriever(fail=True), CircuitBreaker("test")) == 0
+
+
+def test_does_not_cache_while_the_breaker_is_not_closed():
+    breaker = CircuitBreaker("test", cooldown=0.0)
+    breaker._transition("open")
+    assert _cached_entries(_StaticRetriever(docs=DOCS), breaker) == 0
@@ -1,5 +1,6 @@
 from typing import Any, List, Union, Callable, Dict
 from pathlib import Path
+import functools
 import re
 from fastapi import HTTPException, Request
 from typing_extensions import TypedDict
@@ -20,7 +21,11 @@ from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from langserve.pydantic_v1 import BaseModel, Field
 from langchain.tools.retriever import create_retriever_tool
-from app.vectorstore import fullDocVectorstore, splitDocVectorstore
+from app.vectorstore import embeddings, fullDocVectorstore, splitDocVectorstore
+from app.cache import CachedRetriever
+from app.digests import digest_retriever
+from app.history_store import history_writer
+from app.summarizer import SummarizedChatMessageHistory
 import os
 from upstash_redis import Redis
 import dotenv
@@ -28,18 +33,23 @@ import dotenv
 dotenv.load_dotenv()
 
 
+_valid_characters = re.compile(r"^[a-zA-Z0-9-_]+$")
+
+
 def _is_valid_identifier(value: str) -> bool:
     """Check if the value is a valid identifier."""
-    valid_characters = re.compile(r"^[a-zA-Z0-9-_]+$")
-    return bool(valid_characters.match(value))
+    return bool(_valid_characters.match(value))
 
 
 def create_session_factory(
     base_dir: Union[str, Path],
 ) -> Callable[[str], BaseChatMessageHistory]:
+    # Reuse history objects across turns; they share one Redis client and the
+    # writer's message cache. Invalid identifiers raise and are not cached.
+    @functools.lru_cache(maxsize=1024)
     def get_chat_history(
         userId: str, conversationId: str
-    ) -> UpstashRedisChatMessageHistory:
+    ) -> SummarizedChatMessageHistory:
         """Get a chat history from a user id and conversation id."""
         if not _is_valid_identifier(userId):
             raise ValueError(
@@ -57,16 +67,18 @@ def create_session_factory(
                 "chain.invoke(.., {'configurable': {'conversationId': '123'}})"
             )
 
-        return UpstashRedisChatMessageHistory(
-            url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
-            token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
-            session_id=conversationId,
-            key_prefix=userId + "/",
+        # Same key layout as UpstashRedisChatMessageHistory, but writes are
+        # batched off the response path and completed turns are summarized
+        return SummarizedChatMessageHistory(
+            history_writer, key=f"{userId}/{conversationId}"
         )
 
     return get_chat_history
 
 
+get_session_history = create_session_factory("chat_histories")
+
+
 prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -101,12 +113,23 @@ Remember that you are limited to the information provided by the tools. Do not u
     ]
 )
 
-fullDocRetriever = fullDocVectorstore.as_retriever(search_kwargs={"k": 1})
+# Results are cached per normalized query, shared across workers (app/cache.py)
+fullDocRetriever = CachedRetriever(
+    retriever=fullDocVectorstore.as_retriever(search_kwargs={"k": 1}),
+    namespace="full",
+)
+
+# The testimony's digest and most relevant sections instead of the whole
+# testimony; falls back to fullDocRetriever until app/build_digests.py has run
+personalTestimonyRetriever = digest_retriever(embeddings, fallback=fullDocRetriever)
 
-splitDocRetriever = splitDocVectorstore.as_retriever(search_kwargs={"k": 4})
+splitDocRetriever = CachedRetriever(
+    retriever=splitDocVectorstore.as_retriever(search_kwargs={"k": 4}),
+    namespace="split",
+)
 
 fullDocRetrieverTool = create_retriever_tool(
-    fullDocRetriever,
+    personalTestimonyRetriever,
     "personal_testimony_retriever",
     "Use this tool to answer questions about specific individuals in the context of the Holocaust. You must use this tool if you are asked about a specific individual in the context of the Holocaust. Return your answer in plaintext; no XML, markdown, or other formatting is necessary.",
 )
@@ -168,7 +191,7 @@ class InputChat(TypedDict):
 
 executer_with_history = RunnableWithMessageHistory(
     agent_executor,
-    create_session_factory("chat_histories"),
+    get_session_history,
     input_messages_key="input",
     history_messages_key="chat_history",
     history_factory_config=[
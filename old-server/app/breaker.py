@@ -0,0 +1,262 @@
+"""Latency-aware circuit breaker for the vector store queries.
+
+Without it, a slow or unreachable Upstash Vector keeps every retriever tool
+waiting for the HTTP timeout. Calls through the breaker are bounded instead:
+a second identical request is started if the first has not answered after
+VECTOR_HEDGE_AFTER seconds, the fallback answers after VECTOR_TIMEOUT
+seconds, and once too many recent calls failed or were slow the breaker opens
+and sends every call to the fallback for VECTOR_BREAKER_COOLDOWN seconds,
+then lets one probe through to check for recovery. Blocking calls go through
+call_sync(), which opens, probes and falls back the same way but can't hedge
+or time out.
+
+Callers that cache results run the queries inside watch(), which tells them
+whether any query was answered by the fallback or made while the breaker was
+not closed, so those results aren't cached.
+
+This is the new server's agent/breaker.py with the same API; the two servers
+don't share a package.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+# Seconds before a call is abandoned for the fallback
+VECTOR_TIMEOUT = float(os.getenv("VECTOR_TIMEOUT", "3.0"))
+# Seconds before a second, identical call is started
+VECTOR_HEDGE_AFTER = float(os.getenv("VECTOR_HEDGE_AFTER", "0.5"))
+# Calls slower than this count against Upstash
+VECTOR_SLOW_CALL = float(os.getenv("VECTOR_SLOW_CALL", "1.5"))
+VECTOR_BREAKER_COOLDOWN = float(os.getenv("VECTOR_BREAKER_COOLDOWN", "30"))
+# Opens when this share of the last BREAKER_WINDOW calls failed or was slow
+BREAKER_FAILURE_RATIO = 0.5
+BREAKER_WINDOW = 50
+BREAKER_MIN_CALLS = 10
+
+
+class BreakerOpenError(RuntimeError):
+    """Raised when the breaker is open and there is no fallback."""
+
+
+class Watch:
+    degraded = False
+
+
+_watch = contextvars.ContextVar("breaker_watch", default=None)
+
+
+@contextlib.contextmanager
+def watch():
+    """Watch the breaker calls made within the block, including in child tasks."""
+    current = Watch()
+    token = _watch.set(current)
+    try:
+        yield current
+    finally:
+        _watch.reset(token)
+
+
+def mark_degraded():
+    current = _watch.get()
+    if current is not None:
+        current.degraded = True
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        timeout=VECTOR_TIMEOUT,
+        hedge_after=VECTOR_HEDGE_AFTER,
+        slow_call=VECTOR_SLOW_CALL,
+        failure_ratio=BREAKER_FAILURE_RATIO,
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        cooldown=VECTOR_BREAKER_COOLDOWN,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.slow_call = slow_call
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        # allow() and record() are also called from call_sync's threads
+        self._lock = threading.Lock()
+        # (succeeded, seconds) of recent calls
+        self._recent = deque(maxlen=window)
+        self.counts = dict.fromkeys(
+            ["calls", "failures", "timeouts", "slow_calls", "hedges", "hedge_wins",
+             "fallbacks", "rejected", "opened"],
+            0,
+        )
+
+    def allow(self):
+        """Whether a call may go to Upstash. Half open, this claims the probe."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._transition("half_open")
+            # Half open: one probe at a time
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def _transition(self, state):
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == "open":
+            self._opened_at = time.monotonic()
+            self.counts["opened"] += 1
+        if state == "closed":
+            self._recent.clear()
+
+    def record(self, succeeded, seconds):
+        """Record the outcome of a call that allow() let through."""
+        with self._lock:
+            slow = seconds > self.slow_call
+            self.counts["slow_calls"] += slow
+            self._recent.append((succeeded and not slow, seconds))
+            if self.state == "half_open":
+                self._probing = False
+                self._transition("closed" if succeeded and not slow else "open")
+                return
+            bad = sum(1 for ok, _ in self._recent if not ok)
+            if (
+                self.state == "closed"
+                and len(self._recent) >= self.min_calls
+                and bad / len(self._recent) >= self.failure_ratio
+            ):
+                self._transition("open")
+
+    async def _hedged(self, primary):
+        first = asyncio.ensure_future(primary())
+        tasks = {first}
+        hedged = False
+        deadline = time.monotonic() + self.timeout
+        error = None
+        try:
+            while tasks:
+                wait = deadline - time.monotonic()
+                if not hedged:
+                    wait = min(wait, self.hedge_after)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        self.counts["hedge_wins"] += task is not first
+                        return task.result()
+                    error = task.exception()
+                if time.monotonic() >= deadline:
+                    self.counts["timeouts"] += 1
+                    raise asyncio.TimeoutError(f"{self.name} timed out")
+                if not hedged and not done:
+                    hedged = True
+                    self.counts["hedges"] += 1
+                    tasks.add(asyncio.ensure_future(primary()))
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _reject(self, fallback):
+        self.counts["rejected"] += 1
+        if fallback is None:
+            raise BreakerOpenError(f"{self.name} is unavailable")
+        self.counts["fallbacks"] += 1
+        return fallback()
+
+    def _failed(self, error, seconds, has_fallback):
+        self.counts["failures"] += 1
+        self.record(False, seconds)
+        if has_fallback:
+            print(f"Circuit breaker {self.name}: falling back after {error!r}")
+            self.counts["fallbacks"] += 1
+            mark_degraded()
+
+    def _cancelled(self, seconds):
+        # Cancelled, e.g. the client went away. A probe that never finished
+        # counts as failed, so the breaker does not stay half open forever.
+        if self.state == "half_open":
+            self.counts["failures"] += 1
+            self.record(False, seconds)
+
+    async def call(self, primary, fallback=None):
+        """Await primary() within the breaker, or fallback() if it can't answer."""
+        self.counts["calls"] += 1
+        if self.state != "closed":
+            mark_degraded()
+        if not self.allow():
+            return await self._reject(fallback)
+
+        start = time.monotonic()
+        try:
+            result = await self._hedged(primary)
+        except Exception as e:
+            self._failed(e, time.monotonic() - start, fallback is not None)
+            if fallback is None:
+                raise
+            return await fallback()
+        except BaseException:
+            self._cancelled(time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def call_sync(self, primary, fallback=None):
+        """Blocking version of call(), without hedging or a timeout."""
+        self.counts["calls"] += 1
+        if self.state != "closed":
+            mark_degraded()
+        if not self.allow():
+            return self._reject(fallback)
+
+        start = time.monotonic()
+        try:
+            result = primary()
+        except Exception as e:
+            self._failed(e, time.monotonic() - start, fallback is not None)
+            if fallback is None:
+                raise
+            return fallback()
+        except BaseException:
+            self._cancelled(time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def metrics(self):
+        latencies = [seconds for _, seconds in self._recent]
+        return {
+            "name": self.name,
+            "state": self.state,
+            **self.counts,
+            "window": len(latencies),
+            "p50_ms": _percentile(latencies, 0.5),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+        }
+
+
+vector_breaker = CircuitBreaker("upstash-vector")
@@ -0,0 +1,114 @@
+"""Precompute a digest and a section index for every optimized testimony.
+
+For each file in app/optimized_sources this writes app/digests/<name>.json with:
+    header    the opening line of the testimony (interviewee, date, place)
+    digest    a structured summary of the testimony (who, where, what happened)
+    sections  the testimony split into short passages, each with its embedding
+    embedding the embedding of the digest, used to pick the testimony
+
+The personal testimony tool then sends the digest and the few most relevant
+sections to the model instead of the whole testimony. Re-run this after
+changing optimized_sources; unchanged testimonies are skipped.
+
+Usage: poetry run python -m app.build_digests [--force]
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.digests import DIGEST_DIR, encode_vector
+
+load_dotenv()
+
+source_dir = f"{Path(__file__).parent}/optimized_sources"
+force = "--force" in sys.argv
+
+DIGEST_PROMPT = """You are preparing a reference card for a historian about one testimony from David Boder's 1946 interviews with Holocaust survivors and displaced persons.
+
+Using only the transcript below, write the card in plain text with these headings, one short line or list per heading. Write "Not mentioned" if the transcript does not say.
+
+Interviewee:
+Interview (date, place, language):
+Born (date, place):
+Family:
+Before the war:
+Persecution and camps (in order, with places and dates):
+Liberation:
+After the war:
+Notable details:
+
+Transcript:
+{transcript}"""
+
+model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+embeddings = OpenAIEmbeddings()
+# Boder's questions start new passages where possible
+splitter = RecursiveCharacterTextSplitter(
+    chunk_size=1000,
+    chunk_overlap=100,
+    separators=["David Boder:", ". ", " ", ""],
+)
+
+os.makedirs(DIGEST_DIR, exist_ok=True)
+
+for filename in sorted(os.listdir(source_dir)):
+    if not filename.endswith(".txt"):
+        continue
+    with open(os.path.join(source_dir, filename), "r", encoding="utf-8") as file:
+        content = file.read()
+
+    checksum = hashlib.sha256(content.encode()).hexdigest()
+    output_path = os.path.join(DIGEST_DIR, filename.replace(".txt", ".json"))
+    if not force and os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as file:
+            if json.load(file).get("checksum") == checksum:
+                print(f"{filename}: up to date")
+                continue
+
+    digest = model.invoke(DIGEST_PROMPT.format(transcript=content)).content
+    # "AVIARY TRANSCRIPTION David P. Boder Interviews Jola Gross, ..."; the
+    # frontend finds the source link from the interviewee's name in it
+    header = content.split(" Media File:")[0][:300]
+    sections = splitter.split_text(content)
+    vectors = embeddings.embed_documents([digest, *sections])
+
+    offset = 0
+    section_index = []
+    for number, (text, vector) in enumerate(zip(sections, vectors[1:])):
+        start = content.find(text[:200], offset)
+        if start >= 0:
+            offset = start
+        section_index.append(
+            {
+                "id": number,
+                "start": start,
+                "text": text,
+                "embedding": encode_vector(vector),
+            }
+        )
+
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "source": filename,
+                "checksum": checksum,
+                "header": header,
+                "digest": digest,
+                "embedding": encode_vector(vectors[0]),
+                "sections": section_index,
+            },
+            file,
+        )
+    print(
+        f"{filename}: {len(content)} characters -> digest of {len(digest)} "
+        f"and {len(sections)} sections"
+    )
+
+print("Digests complete.")
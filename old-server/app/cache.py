@@ -0,0 +1,210 @@
+import array
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app.breaker import watch
+
+# Optional Redis on the same host, shared by every worker process
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+# Entries kept in each process in front of (or instead of) Redis
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "4096"))
+LOCAL_CACHE_TTL = 60
+
+EMBEDDING_TTL = 7 * 24 * 3600
+TOKEN_TTL = 300
+RETRIEVAL_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+# Part of every retrieval cache key; bump it after re-ingesting a namespace so
+# cached results from the old index are never served
+INDEX_VERSION = os.getenv("INDEX_VERSION", "1")
+
+
+class SharedCache:
+    """Byte cache shared across worker processes.
+
+    Values are kept in a small in-process LRU and, when a Redis URL is given,
+    in Redis so other workers can reuse them. The Redis client is created
+    lazily in each process, so it is never shared across a fork. Redis errors
+    fall back to the local tier.
+    """
+
+    def __init__(self, url: Optional[str], local_size: int = LOCAL_CACHE_SIZE):
+        self.url = url
+        self.local_size = local_size
+        self._local: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._client = None
+        self._pid: Optional[int] = None
+
+    def _redis(self):
+        if not self.url:
+            return None
+        if self._pid != os.getpid():
+            import redis.asyncio as aioredis
+
+            self._client = aioredis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    def get_local(self, key: str) -> Optional[bytes]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def set_local(self, key: str, value: bytes, ttl: float) -> None:
+        self._local[key] = (time.monotonic() + min(ttl, LOCAL_CACHE_TTL), value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.get_local(key)
+        if value is not None:
+            return value
+
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            value = await client.get(key)
+        except Exception as e:
+            print(f"Cache Redis error: {e}")
+            return None
+        if value is not None:
+            self.set_local(key, value, LOCAL_CACHE_TTL)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.set_local(key, value, ttl)
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            await client.set(key, value, ex=max(1, int(ttl)))
+        except Exception as e:
+            print(f"Cache Redis error: {e}")
+
+
+shared_cache = SharedCache(CACHE_REDIS_URL)
+
+
+def cache_key(prefix: str, *parts: str) -> str:
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that caches query vectors in the shared cache.
+
+    Document embeddings are passed through; they are only computed at
+    ingestion time.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str):
+        self.embeddings = embeddings
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = cache_key("embedding", self.model, text)
+        cached = shared_cache.get_local(key)
+        if cached is not None:
+            return array.array("f", cached).tolist()
+        vector = self.embeddings.embed_query(text)
+        shared_cache.set_local(key, array.array("f", vector).tobytes(), EMBEDDING_TTL)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = cache_key("embedding", self.model, text)
+        cached = await shared_cache.get(key)
+        if cached is not None:
+            return array.array("f", cached).tolist()
+        vector = await self.embeddings.aembed_query(text)
+        await shared_cache.set(key, array.array("f", vector).tobytes(), EMBEDDING_TTL)
+        return vector
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and whitespace don't change what a query retrieves."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+class CachedRetriever(BaseRetriever):
+    """Retriever wrapper that caches results in the shared cache.
+
+    Keyed by the index version, namespace, normalized query, k and filter.
+    Empty results and results fetched while the circuit breaker wasn't closed
+    (including those from the local fallback) are not cached, so they stop
+    being served once Upstash recovers.
+    """
+
+    retriever: BaseRetriever
+    namespace: str
+
+    def key(self, query: str) -> str:
+        search_kwargs = getattr(self.retriever, "search_kwargs", {})
+        return cache_key(
+            "retrieval",
+            INDEX_VERSION,
+            self.namespace,
+            normalize_query(query),
+            str(search_kwargs.get("k", 4)),
+            json.dumps(search_kwargs.get("filter"), sort_keys=True, default=str),
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key = self.key(query)
+        cached = shared_cache.get_local(key)
+        if cached is not None:
+            return [Document(**doc) for doc in json.loads(cached)]
+        with watch() as calls:
+            docs = self.retriever.invoke(query, {"callbacks": run_manager.get_child()})
+        if docs and not calls.degraded:
+            shared_cache.set_local(key, self.encode(docs), RETRIEVAL_TTL)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key = self.key(query)
+        cached = await shared_cache.get(key)
+        if cached is not None:
+            return [Document(**doc) for doc in json.loads(cached)]
+        with watch() as calls:
+            docs = await self.retriever.ainvoke(
+                query, {"callbacks": run_manager.get_child()}
+            )
+        if docs and not calls.degraded:
+            await shared_cache.set(key, self.encode(docs), RETRIEVAL_TTL)
+        return docs
+
+    @staticmethod
+    def encode(docs: List[Document]) -> bytes:
+        return json.dumps(
+            [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+        ).encode()
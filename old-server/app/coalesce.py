@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import AsyncIterator, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agent import get_session_history, model
+from app.cache import INDEX_VERSION, cache_key, shared_cache
+from app.singleflight import SingleFlight
+
+# Set CHAT_COALESCE=true to share one agent run between identical in-flight
+# requests. Off by default, like coalesce_requests in the new server
+COALESCE_ENABLED = os.getenv("CHAT_COALESCE", "false").lower() == "true"
+# Seconds a finished answer is replayed to identical requests from the shared
+# cache. Off (0) by default: a replayed answer was written by another user's run
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "0"))
+
+_whitespace = re.compile(r"\s+")
+
+chat_flights = SingleFlight()
+
+
+def normalize_question(question: str) -> str:
+    return _whitespace.sub(" ", question).strip().rstrip("?!. ").lower()
+
+
+async def coalesce_key(body: dict) -> Optional[str]:
+    """Key a chat request by question, model, index and conversation so far.
+
+    The key is used for coalescing and for the answer cache. Returns None if
+    the request can't be coalesced or cached, or both are off, without
+    reading the conversation.
+    """
+    if not COALESCE_ENABLED and not ANSWER_CACHE_TTL:
+        return None
+
+    try:
+        question = body["input"]["input"]
+        configurable = body["config"]["configurable"]
+        history = get_session_history(
+            configurable["userId"], configurable["conversationId"]
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    messages = await asyncio.to_thread(lambda: history.messages)
+    raw = json.dumps(
+        [
+            model.model_name,
+            INDEX_VERSION,
+            normalize_question(question),
+            [[message.type, message.content] for message in messages],
+        ],
+        default=str,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _strip_run_metadata(event: dict) -> dict:
+    """Drop the metadata (user and conversation ids) of the request that started the run."""
+    if event.get("event") != "data":
+        return event
+    data = json.loads(event["data"])
+    data.pop("metadata", None)
+    return {**event, "data": json.dumps(data)}
+
+
+def _final_output(events: List[dict]) -> Optional[str]:
+    for event in reversed(events):
+        if event.get("event") != "data":
+            continue
+        data = json.loads(event["data"])
+        output = (data.get("data") or {}).get("output")
+        if data.get("event") == "on_chain_end" and isinstance(output, dict):
+            if isinstance(output.get("output"), str):
+                return output["output"]
+    return None
+
+
+def _replay(events: AsyncIterator[dict], body: dict) -> AsyncIterator[dict]:
+    """Stream another run's events to a request.
+
+    The request's own chat history is updated with the shared answer once the
+    events end.
+    """
+
+    async def stream() -> AsyncIterator[dict]:
+        seen = []
+        async for event in events:
+            seen.append(event)
+            yield _strip_run_metadata(event)
+
+        output = _final_output(seen)
+        if output is not None:
+            configurable = body["config"]["configurable"]
+            history = get_session_history(
+                configurable["userId"], configurable["conversationId"]
+            )
+            await asyncio.to_thread(
+                history.add_messages,
+                [HumanMessage(content=body["input"]["input"]), AIMessage(content=output)],
+            )
+
+    return stream()
+
+
+def follow_flight(key: str, body: dict) -> AsyncIterator[dict]:
+    """Attach a request to an in-flight run for the same question."""
+    return _replay(chat_flights.join(key), body)
+
+
+async def cached_answer(key: str, body: dict) -> Optional[AsyncIterator[dict]]:
+    """Replay a finished run for the same question from the shared cache, if any."""
+    if not ANSWER_CACHE_TTL:
+        return None
+    value = await shared_cache.get(cache_key("answer", key))
+    if value is None:
+        return None
+    events = json.loads(gzip.decompress(value))
+
+    async def stored() -> AsyncIterator[dict]:
+        for event in events:
+            yield event
+
+    return _replay(stored(), body)
+
+
+async def record_answer(key: str, events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Pass a run's events through, caching them once the run has answered."""
+    seen = []
+    async for event in events:
+        seen.append(event)
+        yield event
+    if ANSWER_CACHE_TTL and _final_output(seen) is not None:
+        value = gzip.compress(json.dumps(seen).encode())
+        await shared_cache.set(cache_key("answer", key), value, ANSWER_CACHE_TTL)
@@ -0,0 +1,79 @@
+import base64
+import json
+from typing import Any, Dict
+
+import msgpack
+import zstandard
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+# Stored values are text (the Upstash REST API is JSON), so binary payloads are
+# base64 encoded behind a version prefix. Values without a prefix are the
+# legacy JSON produced by UpstashRedisChatMessageHistory.
+MSGPACK_PREFIX = "m1:"
+ZSTD_PREFIX = "z1:"
+
+# Payloads larger than this (long answers, tool output) are zstd compressed
+ZSTD_THRESHOLD = 1024
+
+# Short field names used in the compact encoding
+_FIELDS = {
+    "content": "c",
+    "name": "n",
+    "additional_kwargs": "k",
+    "tool_calls": "tc",
+    "tool_call_id": "ti",
+}
+
+_compressor = zstandard.ZstdCompressor(level=6)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def _compact(message: BaseMessage) -> Dict[str, Any]:
+    """Keep only the message type and the fields that are set."""
+    data = message_to_dict(message)["data"]
+    compact = {"t": message.type}
+    for field, short in _FIELDS.items():
+        if data.get(field):
+            compact[short] = data[field]
+    return compact
+
+
+def _expand(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a compact message back into the message_to_dict layout."""
+    data = {field: compact[short] for field, short in _FIELDS.items() if short in compact}
+    data.setdefault("content", "")
+    return {"type": compact["t"], "data": data}
+
+
+def encode_message(message: BaseMessage) -> str:
+    payload = msgpack.packb(_compact(message), use_bin_type=True)
+    if len(payload) > ZSTD_THRESHOLD:
+        return ZSTD_PREFIX + base64.b64encode(_compressor.compress(payload)).decode()
+    return MSGPACK_PREFIX + base64.b64encode(payload).decode()
+
+
+def decode_dict(value: str) -> Dict[str, Any]:
+    """Decode a stored value, in any format, to the message_to_dict layout."""
+    if value.startswith(ZSTD_PREFIX):
+        payload = _decompressor.decompress(base64.b64decode(value[len(ZSTD_PREFIX) :]))
+        return _expand(msgpack.unpackb(payload, raw=False))
+    if value.startswith(MSGPACK_PREFIX):
+        payload = base64.b64decode(value[len(MSGPACK_PREFIX) :])
+        return _expand(msgpack.unpackb(payload, raw=False))
+    return json.loads(value)
+
+
+def decode_message(value: str) -> BaseMessage:
+    return messages_from_dict([decode_dict(value)])[0]
+
+
+def to_response_json(value: str) -> str:
+    """Convert a stored value to the JSON string the frontend parses.
+
+    Only the type and the fields that are set are included, which keeps the
+    {"type": ..., "data": {"content": ...}} shape of the legacy format.
+    """
+    data = decode_dict(value)
+    compact = {k: v for k, v in data["data"].items() if v and k in _FIELDS}
+    compact.setdefault("content", "")
+    return json.dumps({"type": data["type"], "data": compact}, separators=(",", ":"))
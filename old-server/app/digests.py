@@ -0,0 +1,212 @@
+"""Serve personal testimony questions from precomputed digests.
+
+Sending a whole testimony (up to 40 KB) to the model for every question about a
+person makes the prompt huge and slow. app/build_digests.py precomputes a
+digest and an embedded section index per testimony; this retriever picks the
+testimony, then returns its digest and the few sections closest to the
+question, about a tenth of the tokens.
+
+Each testimony's section embeddings are stacked into a matrix when the digests
+are loaded, so scoring a query is one matrix-vector product per testimony.
+The digests are read once per process; restart the workers after rebuilding.
+
+The testimony is picked locally, by the interviewee's surname (the file name)
+if it appears in the question, otherwise by embedding similarity to the
+digests and sections. Only the query embedding is computed per request, and it
+is cached.
+"""
+
+import array
+import base64
+import functools
+import heapq
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+import numpy as np
+
+DIGEST_DIR = f"{Path(__file__).parent}/digests"
+SECTIONS_PER_ANSWER = int(os.getenv("DIGEST_SECTIONS", "3"))
+
+_word = re.compile(r"[a-zà-ÿ]+")
+
+
+def encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(array.array("f", vector).tobytes()).decode()
+
+
+def decode_vector(data: str) -> array.array:
+    vector = array.array("f")
+    vector.frombytes(base64.b64decode(data))
+    return vector
+
+
+def _section_scores(entry: Dict[str, Any], vector: np.ndarray) -> np.ndarray:
+    # OpenAI embeddings are normalized, so these are cosine similarities
+    return entry["matrix"] @ vector
+
+
+@functools.lru_cache(maxsize=None)
+def load_digests(directory: str = DIGEST_DIR) -> Dict[str, Dict[str, Any]]:
+    """Digests keyed by testimony name (the source file name without .txt)."""
+    digests = {}
+    if not os.path.isdir(directory):
+        return digests
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as file:
+            entry = json.load(file)
+        entry["embedding"] = np.asarray(decode_vector(entry["embedding"]))
+        # One row per section, in section order
+        entry["matrix"] = np.array(
+            [decode_vector(section.pop("embedding")) for section in entry["sections"]],
+            dtype=np.float32,
+        )
+        digests[filename[: -len(".json")]] = entry
+    return digests
+
+
+def _score(entry: Dict[str, Any], vector: np.ndarray, section_scores=None) -> float:
+    if section_scores is None:
+        section_scores = _section_scores(entry, vector)
+    best_section = float(section_scores.max()) if len(section_scores) else 0.0
+    return float(entry["embedding"] @ vector) + best_section
+
+
+def _vector(vector) -> np.ndarray:
+    return np.asarray(vector, dtype=np.float32)
+
+
+# Fallbacks for the vector store namespaces (see app/vectorstore.py), searching
+# the digest sections, which are embedded with the same model as the namespaces
+
+
+def section_matches(
+    digests: Dict[str, Dict[str, Any]], vector, k: int
+) -> List[Tuple[Document, float]]:
+    """The k sections closest to vector across all testimonies, like "split"."""
+    vector = _vector(vector)
+    scored = (
+        (float(score), entry["source"], section)
+        for entry in digests.values()
+        for score, section in zip(_section_scores(entry, vector), entry["sections"])
+    )
+    return [
+        (
+            Document(
+                page_content=section["text"],
+                metadata={"source": source, "start_index": section["start"]},
+            ),
+            score,
+        )
+        for score, source, section in heapq.nlargest(k, scored, key=lambda s: s[0])
+    ]
+
+
+def testimony_matches(
+    digests: Dict[str, Dict[str, Any]], documents: List[Document], vector, k: int
+) -> List[Tuple[Document, float]]:
+    """The k whole testimonies closest to vector, like "full"."""
+    by_name = {os.path.basename(doc.metadata["source"]): doc for doc in documents}
+    vector = _vector(vector)
+    ranked = sorted(
+        ((_score(entry, vector), entry["source"]) for entry in digests.values()),
+        reverse=True,
+    )
+    return [
+        (by_name[source], score) for score, source in ranked if source in by_name
+    ][:k]
+
+
+class DigestRetriever(BaseRetriever):
+    """Return a testimony's digest and its sections most relevant to the query.
+
+    Falls back to ``fallback`` (the full-document retriever) if no digests
+    have been built.
+    """
+
+    digests: Dict[str, Dict[str, Any]]
+    embeddings: Any
+    fallback: BaseRetriever
+    k: int = SECTIONS_PER_ANSWER
+
+    def _pick(
+        self, query: str, vector: np.ndarray
+    ) -> Tuple[Dict[str, Any], np.ndarray]:
+        """The testimony to answer from, and the scores of its sections."""
+        words = set(_word.findall(query.lower()))
+        named = [name for name in self.digests if name in words]
+        if len(named) == 1:
+            entry = self.digests[named[0]]
+            return entry, _section_scores(entry, vector)
+
+        candidates = [self.digests[name] for name in named] or list(
+            self.digests.values()
+        )
+        scored = [(entry, _section_scores(entry, vector)) for entry in candidates]
+        return max(scored, key=lambda pair: _score(pair[0], vector, pair[1]))
+
+    def _documents(self, query: str, vector) -> List[Document]:
+        entry, scores = self._pick(query, _vector(vector))
+        best = np.argsort(-scores, kind="stable")[: self.k]
+        sections = [entry["sections"][i] for i in best]
+        # Keep the passages in the order they were told
+        sections.sort(key=lambda s: s["id"])
+        source = entry["source"]
+        # The testimony's own opening line comes first, as in the full
+        # testimony; the frontend reads the interviewee's name from it
+        header = entry.get("header") or entry["sections"][0]["text"][:300]
+        documents = [
+            Document(
+                page_content=f"{header}\n\nDigest:\n{entry['digest']}",
+                metadata={"source": source, "kind": "digest"},
+            )
+        ]
+        for section in sections:
+            documents.append(
+                Document(
+                    page_content=f"Excerpt from {source}:\n{section['text']}",
+                    metadata={
+                        "source": source,
+                        "kind": "section",
+                        "section": section["id"],
+                        "start": section["start"],
+                    },
+                )
+            )
+        return documents
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.digests:
+            return self.fallback.invoke(query)
+        return self._documents(query, self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.digests:
+            return await self.fallback.ainvoke(query)
+        return self._documents(query, await self.embeddings.aembed_query(query))
+
+
+def digest_retriever(
+    embeddings, fallback: BaseRetriever, directory: Optional[str] = None
+) -> DigestRetriever:
+    digests = load_digests(directory or DIGEST_DIR)
+    if digests:
+        print(f"Loaded digests for {len(digests)} testimonies")
+    else:
+        print("No testimony digests found; serving full testimonies")
+    return DigestRetriever(digests=digests, embeddings=embeddings, fallback=fallback)
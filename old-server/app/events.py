@@ -0,0 +1,184 @@
+"""Compact event stream for /chat/stream_events.
+
+LangServe forwards every event of the agent run: each chain start and end,
+the full retriever output and every intermediate step, all with their metadata.
+The frontend only renders model tokens, tool status and the load_history
+progress. With the "minimal" profile the stream carries only those events,
+with only the fields the frontend reads. Consecutive tokens of the same model
+run are merged into one event, flushed at least every STREAM_FLUSH_INTERVAL
+seconds, and the stream is gzip compressed (with a sync flush after every
+write, so events are not held back) when the client accepts it.
+"""
+
+import asyncio
+import json
+import os
+import zlib
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# "minimal" or "full" (everything LangServe emits)
+STREAM_PROFILE = os.getenv("CHAT_STREAM_PROFILE", "minimal")
+STREAM_GZIP = os.getenv("CHAT_STREAM_GZIP", "true").lower() == "true"
+# Longest time a token waits to be merged with the ones after it
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+# The frontend only needs the opening words of a tool's output (to link the source)
+TOOL_OUTPUT_CHARS = 300
+
+_STATUS_EVENTS = {"on_tool_start", "on_retriever_start"}
+_HISTORY_EVENTS = {"on_chain_start", "on_chain_stream", "on_chain_end"}
+
+
+def _minimal(data: dict, seen_history_stream: set) -> Optional[dict]:
+    """The fields of an event the frontend uses, or None to drop it."""
+    kind = data.get("event")
+    base = {
+        "event": kind,
+        "name": data.get("name"),
+        "run_id": data.get("run_id"),
+        "tags": data.get("tags"),
+    }
+    if kind == "on_chat_model_stream":
+        chunk = (data.get("data") or {}).get("chunk") or {}
+        content = chunk.get("content") if isinstance(chunk, dict) else None
+        if not content or not isinstance(content, str):
+            return None
+        return {**base, "data": {"chunk": {"content": content}}}
+    if kind in _STATUS_EVENTS:
+        return {**base, "data": {}}
+    if kind == "on_tool_end":
+        output = (data.get("data") or {}).get("output")
+        if not isinstance(output, str):
+            output = json.dumps(output, default=str)
+        return {**base, "data": {"output": output[:TOOL_OUTPUT_CHARS]}}
+    if kind in _HISTORY_EVENTS and data.get("name") == "load_history":
+        if kind == "on_chain_stream":
+            # Only the first one changes what the frontend shows
+            if data.get("run_id") in seen_history_stream:
+                return None
+            seen_history_stream.add(data.get("run_id"))
+            return {**base, "data": {"chunk": True}}
+        return {**base, "data": {}}
+    return None
+
+
+def _sse(data: dict) -> dict:
+    return {"event": "data", "data": json.dumps(data, separators=(",", ":"))}
+
+
+async def minimal_events(events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Filter and shrink LangServe's events, merging consecutive tokens.
+
+    Events other than "data" (end, error, metadata) are passed through.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except BaseException as e:
+            await queue.put(e)
+        else:
+            await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    seen_history_stream: set = set()
+    pending: Optional[dict] = None
+    loop = asyncio.get_running_loop()
+    deadline = 0.0
+    try:
+        while True:
+            try:
+                timeout = max(0.0, deadline - loop.time()) if pending else None
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield _sse(pending)
+                pending = None
+                continue
+
+            if item is done or isinstance(item, BaseException):
+                if pending:
+                    yield _sse(pending)
+                if isinstance(item, BaseException):
+                    raise item
+                return
+
+            if item.get("event") != "data":
+                if pending:
+                    yield _sse(pending)
+                    pending = None
+                yield item
+                continue
+
+            event = _minimal(json.loads(item["data"]), seen_history_stream)
+            if event is None:
+                continue
+            if (
+                pending
+                and event["event"] == "on_chat_model_stream"
+                and event["run_id"] == pending["run_id"]
+            ):
+                pending["data"]["chunk"]["content"] += event["data"]["chunk"]["content"]
+                continue
+            if pending:
+                yield _sse(pending)
+                pending = None
+            if event["event"] == "on_chat_model_stream":
+                pending = event
+                deadline = loop.time() + STREAM_FLUSH_INTERVAL
+            else:
+                yield _sse(event)
+    finally:
+        task.cancel()
+
+
+class GzipStream(Response):
+    """Gzip a streaming response, flushing the compressor after every write."""
+
+    def __init__(self, response: Response):
+        self.response = response
+
+    # Background tasks belong to the wrapped response, which runs them
+    @property
+    def background(self):
+        return self.response.background
+
+    @background.setter
+    def background(self, value):
+        self.response.background = value
+
+    async def __call__(self, scope, receive, send) -> None:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+        async def compressed_send(message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() != b"content-length"
+                ]
+                headers += [(b"content-encoding", b"gzip"), (b"vary", b"Accept-Encoding")]
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                body = compressor.compress(message.get("body", b""))
+                if message.get("more_body", False):
+                    body += compressor.flush(zlib.Z_SYNC_FLUSH)
+                else:
+                    body += compressor.flush(zlib.Z_FINISH)
+                message = {**message, "body": body}
+            await send(message)
+
+        await self.response(scope, receive, compressed_send)
+
+
+def compact_stream(request: Request, response: Response) -> Response:
+    """Apply the configured event profile and compression to a chat stream."""
+    if STREAM_PROFILE == "minimal":
+        response.body_iterator = minimal_events(response.body_iterator)
+    if STREAM_GZIP and "gzip" in request.headers.get("accept-encoding", ""):
+        return GzipStream(response)
+    return response
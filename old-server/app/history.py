@@ -1,15 +1,26 @@
 from upstash_redis.asyncio import Redis
 import os
 import asyncio
+import json
 
+from dotenv import load_dotenv
 
-async def user_history(user_id: str, return_chats: bool) -> dict:
+from app.codec import to_response_json
+from app.history_store import history_writer
+from app.summarizer import summary_key, summary_worker
 
-    redis = Redis(
-        url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
-        token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
-    )
+load_dotenv()
 
+# One client for all requests, so its HTTP connections are reused
+redis = Redis(
+    url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
+    token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
+)
+
+
+async def user_history(
+    user_id: str, return_chats: bool, return_summaries: bool = False
+) -> dict:
     cursor = 0
     results = []
 
@@ -20,24 +31,39 @@ async def user_history(user_id: str, return_chats: bool) -> dict:
         if cursor == 0:
             break
 
+    if return_summaries:
+        # Summaries are written in the background after each turn; any that
+        # are missing (older conversations) are scheduled now. Conversations
+        # with nothing to summarize are stored with a summary of None.
+        stored = await redis.mget(*[summary_key(key) for key in results]) if results else []
+        summaries = {}
+        for key, value in zip(results, stored):
+            summaries[key] = json.loads(value)["summary"] if value else None
+            if value is None:
+                summary_worker.schedule(key)
+        return summaries
+
     if return_chats:
 
         # Use asyncio.gather to fetch all chat histories concurrently
-        chat_histories = await asyncio.gather(
-            *[redis.lrange(key, 0, -1) for key in results]
-        )
+        chat_histories = await asyncio.gather(*[read_history(key) for key in results])
 
-        return {key: chat for key, chat in zip(results, chat_histories)}
+        return {
+            key: [to_response_json(value) for value in chat]
+            for key, chat in zip(results, chat_histories)
+        }
 
     return results
 
 
-async def chat_history(user_id: str, conversation_id: str) -> list:
-    redis = Redis(
-        url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
-        token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
-    )
+async def read_history(key: str) -> list:
+    # Through the writer, so messages not yet written to Redis are included;
+    # newest first, as stored
+    values = await asyncio.to_thread(history_writer.read, key)
+    return values[::-1]
+
 
-    data = await redis.lrange(f"{user_id}/{conversation_id}", 0, -1)
+async def chat_history(user_id: str, conversation_id: str) -> list:
+    data = await read_history(f"{user_id}/{conversation_id}")
 
-    return data
+    return [to_response_json(value) for value in data]
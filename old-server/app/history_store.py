@@ -0,0 +1,251 @@
+import atexit
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Set
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage
+from upstash_redis import Redis
+import dotenv
+
+from app.codec import decode_message, encode_message
+
+dotenv.load_dotenv()
+
+# Messages waiting to be written before appends start applying backpressure
+MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "1000"))
+# Appends collected into a single pipelined write
+BATCH_SIZE = 100
+# Conversations whose stored messages are kept in memory between turns
+CACHED_HISTORIES = int(os.getenv("HISTORY_CACHE_SIZE", "512"))
+WRITE_RETRIES = 3
+
+
+def _overlap(stored: List[str], pending: List[str]) -> int:
+    """Length of the longest prefix of pending that stored ends with."""
+    for n in range(min(len(stored), len(pending)), 0, -1):
+        if stored[-n:] == pending[:n]:
+            return n
+    return 0
+
+
+class HistoryWriter:
+    """Write chat messages to Redis in pipelined batches off the request path.
+
+    Appends go into a bounded queue that a background thread drains, grouping
+    them per conversation into one LPUSH each and sending all of them in a
+    single pipeline. Messages stay visible to readers of the same conversation
+    until they have been written.
+
+    Recently read conversations are cached and updated in place when this
+    writer appends to them, so the next turn only checks the list length
+    (LLEN) instead of fetching the whole history. If the length differs,
+    another process wrote to it and the history is fetched again.
+
+    Deletes go through the same queue, so appends queued before a delete are
+    never written after it. Until the delete has run, readers only see the
+    messages appended since.
+    """
+
+    def __init__(self, redis: Redis, max_pending: int = MAX_PENDING):
+        self.redis = redis
+        self.max_pending = max_pending
+        self._start()
+        # Threads don't survive fork, e.g. when gunicorn preloads the app, so
+        # each child starts its own writer with empty state
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        # (key, values) appends, and (key, None) deletes
+        self._queue: "queue.Queue[tuple[str, Optional[List[str]]]]" = queue.Queue(
+            self.max_pending
+        )
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[str]] = {}
+        # Keys whose values are being written, and a unique stamp per key that
+        # changes on every append and write, so readers can detect overlaps
+        self._writing: Set[str] = set()
+        self._stamps: Dict[str, int] = {}
+        self._counter = itertools.count()
+        # Per key: queued deletes not yet run, and values appended before the
+        # latest delete that are still queued or being written
+        self._deleting: Dict[str, int] = {}
+        self._dropped: Dict[str, int] = {}
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, key: str, values: List[str]) -> None:
+        with self._lock:
+            self._pending.setdefault(key, []).extend(values)
+            self._stamps[key] = next(self._counter)
+        # Blocks when the queue is full, slowing appends down to the write rate
+        self._queue.put((key, values))
+
+    def read(self, key: str) -> List[str]:
+        """Read the stored values for a key, oldest first, including pending ones."""
+        for _ in range(10):
+            with self._lock:
+                before = self._stamps.get(key)
+                writing = key in self._writing
+                pending = list(self._pending.get(key, []))
+                cached = self._cache.get(key)
+                if key in self._deleting:
+                    # Whatever is stored is about to be deleted
+                    return pending
+            stored = self._fetch(key, cached)
+            with self._lock:
+                after = self._stamps.get(key)
+                # Only trust the read if no write for this key overlapped it
+                if not writing and before == after:
+                    self._cache[key] = stored
+                    self._cache.move_to_end(key)
+                    if len(self._cache) > CACHED_HISTORIES:
+                        self._cache.popitem(last=False)
+                    return stored + pending
+            time.sleep(0.01)
+        # Writes kept overlapping: pending messages may already be stored, so
+        # drop those found at the end of the stored list
+        with self._lock:
+            pending = list(self._pending.get(key, []))
+        return stored + pending[_overlap(stored, pending) :]
+
+    def _fetch(self, key: str, cached: Optional[List[str]]) -> List[str]:
+        if cached is not None and self.redis.llen(key) == len(cached):
+            return cached
+        return self.redis.lrange(key, 0, -1)[::-1]
+
+    def delete(self, key: str) -> None:
+        """Delete the stored values for a key, after the appends queued before it."""
+        with self._lock:
+            dropped = self._pending.pop(key, [])
+            if dropped:
+                self._dropped[key] = self._dropped.get(key, 0) + len(dropped)
+            self._deleting[key] = self._deleting.get(key, 0) + 1
+            self._stamps[key] = next(self._counter)
+            self._cache.pop(key, None)
+        self._queue.put((key, None))
+
+    def flush(self) -> None:
+        """Block until every queued message has been written."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while len(items) < BATCH_SIZE:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch: Dict[str, List[str]] = defaultdict(list)
+            # Values taken off the queue per key, including those not written
+            taken: Dict[str, int] = defaultdict(int)
+            # Deletes per key
+            deletes: Dict[str, int] = defaultdict(int)
+            for key, values in items:
+                if values is None:
+                    # Appends queued before the delete are not written
+                    batch[key] = []
+                    deletes[key] += 1
+                else:
+                    batch[key].extend(values)
+                    taken[key] += len(values)
+            self._write(batch, taken, deletes)
+
+            for _ in items:
+                self._queue.task_done()
+
+    def _write(
+        self,
+        batch: Dict[str, List[str]],
+        taken: Dict[str, int],
+        deletes: Dict[str, int],
+    ) -> None:
+        with self._lock:
+            for key in batch:
+                self._writing.add(key)
+                self._stamps[key] = next(self._counter)
+
+        written = False
+        try:
+            for attempt in range(WRITE_RETRIES):
+                try:
+                    pipeline = self.redis.pipeline()
+                    for key in deletes:
+                        pipeline.delete(key)
+                    for key, values in batch.items():
+                        if values:
+                            pipeline.lpush(key, *values)
+                    pipeline.exec()
+                    written = True
+                    break
+                except Exception as e:
+                    if attempt == WRITE_RETRIES - 1:
+                        print(f"Dropping {len(batch)} chat history writes: {e}")
+                    else:
+                        time.sleep(0.2 * 2**attempt)
+        finally:
+            with self._lock:
+                for key, values in batch.items():
+                    self._writing.discard(key)
+                    if key in deletes:
+                        self._deleting[key] -= deletes[key]
+                        if not self._deleting[key]:
+                            del self._deleting[key]
+                        self._cache.pop(key, None)
+                    elif written and key in self._cache:
+                        self._cache[key] = self._cache[key] + values
+                    # Values appended before a delete were already dropped
+                    # from pending
+                    done = taken[key]
+                    dropped = min(done, self._dropped.get(key, 0))
+                    if dropped:
+                        self._dropped[key] -= dropped
+                        if not self._dropped[key]:
+                            del self._dropped[key]
+                    pending = self._pending.get(key, [])
+                    del pending[: done - dropped]
+                    if pending:
+                        self._stamps[key] = next(self._counter)
+                    else:
+                        self._pending.pop(key, None)
+                        self._stamps.pop(key, None)
+
+
+class WriteBehindChatMessageHistory(BaseChatMessageHistory):
+    """Chat history for one conversation, stored as a Redis list like
+    UpstashRedisChatMessageHistory, with writes batched by a HistoryWriter.
+
+    Messages are stored in the compact encoding from app.codec; legacy JSON
+    entries are still read.
+    """
+
+    def __init__(self, writer: HistoryWriter, key: str):
+        self.writer = writer
+        self.key = key
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore
+        return [decode_message(value) for value in self.writer.read(self.key)]
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.writer.append(self.key, [encode_message(message) for message in messages])
+
+    def clear(self) -> None:
+        self.writer.delete(self.key)
+
+
+history_writer = HistoryWriter(
+    Redis(
+        url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
+        token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
+    )
+)
+
+atexit.register(history_writer.flush)
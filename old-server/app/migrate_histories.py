@@ -0,0 +1,74 @@
+"""Rewrite stored chat histories in the compact encoding from app.codec.
+
+Usage: poetry run python -m app.migrate_histories [--dry-run]
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+from upstash_redis import Redis
+
+from app.codec import MSGPACK_PREFIX, ZSTD_PREFIX, decode_message, encode_message
+
+load_dotenv()
+
+# Replace the list only if nothing was pushed to it since we read it
+REPLACE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+return 1
+"""
+
+dry_run = "--dry-run" in sys.argv
+
+redis = Redis(
+    url=os.getenv("UPSTASH_REDIS_HISTORY_REST_URL"),
+    token=os.getenv("UPSTASH_REDIS_HISTORY_REST_TOKEN"),
+)
+
+
+def migrate(key: str) -> tuple[int, int]:
+    """Migrate one history. Returns the size in bytes before and after."""
+    for _ in range(5):
+        values = redis.lrange(key, 0, -1)
+        encoded = [
+            value
+            if value.startswith((MSGPACK_PREFIX, ZSTD_PREFIX))
+            else encode_message(decode_message(value))
+            for value in values
+        ]
+        before = sum(len(v) for v in values)
+        after = sum(len(v) for v in encoded)
+
+        if dry_run or encoded == values:
+            return before, after
+        if redis.eval(REPLACE_SCRIPT, keys=[key], args=[len(values), *encoded]):
+            return before, after
+
+    print(f"Skipping {key}: it kept changing during migration")
+    return 0, 0
+
+
+total_before = total_after = migrated = 0
+cursor = 0
+while True:
+    cursor, keys = redis.scan(cursor)
+    for key in keys:
+        if redis.type(key) != "list":
+            continue
+        before, after = migrate(key)
+        total_before += before
+        total_after += after
+        migrated += 1
+    if cursor == 0:
+        break
+
+ratio = total_before / total_after if total_after else 0
+print(
+    f"{'Would migrate' if dry_run else 'Migrated'} {migrated} histories: "
+    f"{total_before} -> {total_after} bytes ({ratio:.1f}x smaller)"
+)
@@ -0,0 +1,170 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Sustained chat runs allowed per user per minute, and the burst on top of it
+RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_LIMIT_PER_MINUTE", "10"))
+BURST = float(os.getenv("CHAT_RATE_LIMIT_BURST", "5"))
+
+# Agent runs allowed at once across all users, and how many may wait for a slot
+# (per worker process)
+MAX_CONCURRENT = int(os.getenv("CHAT_MAX_CONCURRENT", "16"))
+MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "32"))
+QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
+
+# Optional Redis backend so limits are shared between processes. Defaults to
+# the shared cache Redis, so multi-worker deployments get one limit per user.
+REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv("CACHE_REDIS_URL")
+
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class TokenBucket:
+    """In-process token bucket keyed by user id.
+
+    Buckets are kept in order of last use. A bucket idle long enough to have
+    refilled is the same as a new one, so those are dropped as they age out.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _evict_full(self, now: float) -> None:
+        refill = self.burst / self.rate
+        while self._buckets:
+            _, ts = next(iter(self._buckets.values()))
+            if now - ts < refill:
+                break
+            self._buckets.popitem(last=False)
+
+    async def acquire(self, key: str) -> Tuple[bool, float]:
+        """Take a token for the key. Returns (allowed, seconds until retry)."""
+        now = time.monotonic()
+        self._evict_full(now)
+        tokens, ts = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - ts) * self.rate)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0.0
+
+        self._buckets[key] = (tokens, now)
+        return False, (1 - tokens) / self.rate
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket stored in Redis, falling back to in-process state on errors."""
+
+    def __init__(self, url: str, rate_per_minute: float, burst: float):
+        super().__init__(rate_per_minute, burst)
+        import redis.asyncio as aioredis
+
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(
+                keys=[f"ratelimit:{key}"],
+                args=[self.rate, self.burst, time.time()],
+            )
+            return bool(int(allowed)), float(retry_after)
+        except Exception as e:
+            print(f"Rate limiter Redis error, using local state: {e}")
+            return await super().acquire(key)
+
+
+class ConcurrencyLimiter:
+    """Global cap on concurrent agent runs with a bounded wait queue."""
+
+    def __init__(self, limit: int, max_queued: int, timeout: float):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    @property
+    def active(self) -> int:
+        return self.limit - self._semaphore._value
+
+    async def acquire(self) -> Optional[Callable[[], None]]:
+        """Wait for a slot. Returns an idempotent release function, or None if rejected."""
+        if self._semaphore.locked() and self._waiting >= self.max_queued:
+            return None
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiting -= 1
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._semaphore.release()
+
+        return release
+
+
+if REDIS_URL:
+    user_limiter: TokenBucket = RedisTokenBucket(REDIS_URL, RATE_PER_MINUTE, BURST)
+else:
+    user_limiter = TokenBucket(RATE_PER_MINUTE, BURST)
+
+chat_slots = ConcurrencyLimiter(MAX_CONCURRENT, MAX_QUEUED, QUEUE_TIMEOUT)
+
+
+async def check_rate_limit(user_id: str) -> None:
+    """Apply the per-user rate limit, raising a 429 with a Retry-After header."""
+    allowed, retry_after = await user_limiter.acquire(user_id)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please wait before asking another question.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def acquire_chat_slot() -> Callable[[], None]:
+    """Take a global run slot, raising a 429 if the server is saturated."""
+    release = await chat_slots.acquire()
+    if release is None:
+        raise HTTPException(
+            status_code=429,
+            detail="The server is busy. Please try again shortly.",
+            headers={"Retry-After": "2"},
+        )
+
+    return release
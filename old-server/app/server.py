@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Header, HTTPException, Depends, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from langserve import add_routes
 from app.agent import executer_with_history
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -8,22 +8,50 @@ from typing_extensions import Annotated
 import jwt
 from jwt import PyJWTError, ExpiredSignatureError, InvalidTokenError
 import os
+import time
 from app.history import chat_history, user_history
-from app.share import set_public, get_public, set_private
+from app.share import (
+    SHARE_CACHE_CONTROL,
+    Body,
+    get_public,
+    public_snapshot,
+    set_private,
+    set_public,
+)
 from app.summary import create_summary
-from typing import List
+from app.ratelimit import acquire_chat_slot, check_rate_limit
+from app.coalesce import (
+    COALESCE_ENABLED,
+    cached_answer,
+    chat_flights,
+    coalesce_key,
+    follow_flight,
+    record_answer,
+)
+from app.events import compact_stream
+from app.breaker import vector_breaker
+from app.history_store import history_writer
+from app.cache import TOKEN_TTL, cache_key, shared_cache
+from typing import AsyncIterator, Callable, List
 from pydantic import BaseModel
 import asyncio
 from langserve import APIHandler
 from sse_starlette import EventSourceResponse
+from starlette.background import BackgroundTask
 
 
-async def verify_token(Authorization: Annotated[str | None, Header()] = None) -> None:
+async def verify_token(Authorization: Annotated[str | None, Header()] = None) -> str:
     if not Authorization:
         raise HTTPException(status_code=403, detail="Authorization header missing")
 
+    token = Authorization.split(" ")[-1]  # Assuming "Bearer <token>" format
+    # Verified tokens are cached so workers don't re-check the signature per request
+    key = cache_key("token", token)
+    user_id = await shared_cache.get(key)
+    if user_id is not None:
+        return user_id.decode()
+
     try:
-        token = Authorization.split(" ")[1]  # Assuming "Bearer <token>" format
         decoded_token = jwt.decode(
             token,
             key=os.getenv("CLERK_PEM_PUBLIC_KEY"),
@@ -34,6 +62,15 @@ async def verify_token(Authorization: Annotated[str | None, Header()] = None) ->
     except (PyJWTError, ExpiredSignatureError, InvalidTokenError) as e:
         raise HTTPException(status_code=403, detail=f"Token is invalid: {str(e)}")
 
+    user_id = decoded_token.get("sub")
+    if not user_id:
+        # Every such token would share one user's history and rate limit
+        raise HTTPException(status_code=401, detail="Token has no subject")
+    ttl = min(TOKEN_TTL, decoded_token.get("exp", time.time() + TOKEN_TTL) - time.time())
+    if ttl >= 1:
+        await shared_cache.set(key, user_id.encode(), ttl)
+    return user_id
+
 
 app = FastAPI(title="Holocaust Answer Engine", version="1.0.5")
 
@@ -50,19 +87,33 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+async def flush_history():
+    # Don't lose chat messages that are still waiting to be written
+    await asyncio.to_thread(history_writer.flush)
+
+
 @unauthenticated.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+@unauthenticated.get("/metrics/breakers")
+async def breaker_metrics():
+    # State and latency of the vector store queries behind the retriever tools
+    return {"vector_store": vector_breaker.metrics()}
+
+
 @unauthenticated.get("/")
 async def redirect_root_to_docs():
     return RedirectResponse("/docs")
 
 
 @authenticated.get("/user_history")
-async def history_route(user_id: str, return_chats: bool = False):
-    return await user_history(user_id, return_chats)
+async def history_route(
+    user_id: str, return_chats: bool = False, return_summaries: bool = False
+):
+    return await user_history(user_id, return_chats, return_summaries)
 
 
 @authenticated.get("/chat_history")
@@ -75,13 +126,35 @@ async def set_public_route(conversation_id: str, user_id: str):
     return await set_public(conversation_id, user_id)
 
 
+def snapshot_response(request: Request, body: Body) -> Response:
+    """Serve a snapshot body, gzipped if the client accepts it, with its ETag."""
+    headers = {
+        "ETag": body.etag,
+        "Cache-Control": SHARE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if body.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(body.gzipped, media_type="application/json", headers=headers)
+    return Response(body.json(), media_type="application/json", headers=headers)
+
+
 @unauthenticated.get("/share/get_public")
-async def get_public_route(conversation_id: str):
+async def get_public_route(request: Request, conversation_id: str):
+    # Public conversations are served from their snapshot
+    snapshot = await public_snapshot(conversation_id)
+    if snapshot is not None:
+        return snapshot_response(request, snapshot.public)
     return await get_public(conversation_id)
 
 
 @unauthenticated.get("/share/get_history")
-async def get_history_route(user_id: str, conversation_id: str):
+async def get_history_route(request: Request, user_id: str, conversation_id: str):
+    snapshot = await public_snapshot(conversation_id)
+    if snapshot is not None and snapshot.user_id == user_id:
+        return snapshot_response(request, snapshot.history)
     return await chat_history(user_id, conversation_id)
 
 
@@ -114,12 +187,66 @@ async def create_summary_route(body: HistoriesRequest):
             "content": {"text/event-stream": {"example": "data: message"}},
         },
         401: {"description": "Unauthorized access."},
+        429: {"description": "Rate limited or server busy. See the Retry-After header."},
         500: {"description": "Internal server error."},
     },
 )
-async def v2_stream(request: Request) -> EventSourceResponse:
+async def v2_stream(
+    request: Request, user_id: Annotated[str, Depends(verify_token)]
+) -> EventSourceResponse:
     """Handle stream request."""
-    return await APIHandler(executer_with_history, path="/chat").astream_events(request)
+    await check_rate_limit(user_id)
+
+    # Identical questions are answered from the answer cache, or share one
+    # agent run while in flight
+    body = await request.json()
+    key = await coalesce_key(body)
+    if key is not None:
+        cached = await cached_answer(key, body)
+        if cached is not None:
+            return compact_stream(request, EventSourceResponse(cached))
+    if key is not None and COALESCE_ENABLED and key in chat_flights:
+        return compact_stream(request, EventSourceResponse(follow_flight(key, body)))
+
+    release = await acquire_chat_slot()
+    try:
+        response = await APIHandler(executer_with_history, path="/chat").astream_events(
+            request
+        )
+    except BaseException:
+        release()
+        raise
+
+    # Hold the run slot until the stream has finished, not just until we return
+    events = release_when_done(response.body_iterator, release)
+
+    if key is not None:
+        events = record_answer(key, events)
+    if key is not None and COALESCE_ENABLED:
+        if key in chat_flights:
+            # Another identical request started while we were waiting for a slot
+            release()
+            return compact_stream(
+                request, EventSourceResponse(follow_flight(key, body))
+            )
+        # Followers need the full events, so the profile is applied per request
+        response.body_iterator = chat_flights.stream(key, lambda: events)
+        return compact_stream(request, response)
+
+    response.body_iterator = events
+    # Also release if the client disconnects before the stream is iterated
+    response.background = BackgroundTask(release)
+    return compact_stream(request, response)
+
+
+async def release_when_done(
+    events: AsyncIterator, release: Callable[[], None]
+) -> AsyncIterator:
+    try:
+        async for event in events:
+            yield event
+    finally:
+        release()
 
 
 app.include_router(authenticated)
@@ -1,17 +1,100 @@
 from upstash_redis.asyncio import Redis
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import asyncio
+import base64
+import gzip
+import hashlib
 import os
 import json
+import time
 
 from dotenv import load_dotenv
 
+from app.codec import to_response_json
+from app.history_store import history_writer
+
+load_dotenv()
+
+# One client for all requests, so its HTTP connections are reused
+redis = Redis(
+    url=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_URL"),
+    token=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_TOKEN"),
+)
+
+# Snapshots of public conversations, written by set_public and deleted by
+# set_private. They never change, so they can be cached anywhere until then.
+SNAPSHOT_PREFIX = "snapshot:"
+# Snapshots kept in memory by each worker, and for how long. A conversation
+# made private stops being served by other workers within SNAPSHOT_TTL.
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "256"))
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", "60"))
+# Browsers and CDNs may reuse a response this long without revalidating
+SHARE_CACHE_CONTROL = f"public, max-age={SNAPSHOT_TTL}"
+
+
+@dataclass(frozen=True)
+class Body:
+    """A gzip-compressed JSON response body and its ETag."""
+
+    gzipped: bytes
+    etag: str
+
+    @classmethod
+    def from_json(cls, value) -> "Body":
+        raw = json.dumps(value, separators=(",", ":")).encode()
+        digest = hashlib.sha256(raw).hexdigest()[:32]
+        # mtime=0 keeps the compressed bytes identical across workers
+        return cls(gzip.compress(raw, mtime=0), f'"{digest}"')
+
+    def json(self) -> bytes:
+        return gzip.decompress(self.gzipped)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    user_id: str
+    public: Body
+    history: Body
+
+    @classmethod
+    def load(cls, stored: str) -> "Snapshot":
+        data = json.loads(gzip.decompress(base64.b64decode(stored)))
+        return cls(
+            user_id=data["user_id"],
+            public=Body.from_json({"public": True, "user_id": data["user_id"]}),
+            history=Body.from_json(data["messages"]),
+        )
 
-async def set_public(conversation_id: str, user_id: str) -> None:
-    load_dotenv()
-    redis = Redis(
-        url=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_URL"),
-        token=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_TOKEN"),
-    )
 
+_snapshots: "OrderedDict[str, Tuple[float, Snapshot]]" = OrderedDict()
+
+
+def _remember(conversation_id: str, snapshot: Snapshot) -> None:
+    _snapshots[conversation_id] = (time.monotonic() + SNAPSHOT_TTL, snapshot)
+    _snapshots.move_to_end(conversation_id)
+    while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+        _snapshots.popitem(last=False)
+
+
+async def public_snapshot(conversation_id: str) -> Optional[Snapshot]:
+    """The snapshot of a public conversation, from memory if possible."""
+    entry = _snapshots.get(conversation_id)
+    if entry is not None and entry[0] > time.monotonic():
+        _snapshots.move_to_end(conversation_id)
+        return entry[1]
+
+    stored = await redis.get(SNAPSHOT_PREFIX + conversation_id)
+    if stored is None:
+        _snapshots.pop(conversation_id, None)
+        return None
+    snapshot = Snapshot.load(stored)
+    _remember(conversation_id, snapshot)
+    return snapshot
+
+
+async def set_public(conversation_id: str, user_id: str) -> None:
     key = conversation_id
     key_type = await redis.type(key)
 
@@ -29,18 +112,24 @@ async def set_public(conversation_id: str, user_id: str) -> None:
     # Update only the "public" field and add "user_id", while keeping the rest of the existing data
     existing_data.update({"public": True, "user_id": user_id})
 
+    # Freeze the conversation as it is now, including messages not yet written,
+    # newest first like /chat_history
+    values = await asyncio.to_thread(history_writer.read, f"{user_id}/{conversation_id}")
+    messages = [to_response_json(value) for value in reversed(values)]
+    stored = base64.b64encode(
+        gzip.compress(
+            json.dumps({"user_id": user_id, "messages": messages}).encode(), mtime=0
+        )
+    ).decode()
+    await redis.set(SNAPSHOT_PREFIX + conversation_id, stored)
+    _remember(conversation_id, Snapshot.load(stored))
+
     # Set the updated value back in Redis
     await redis.set(key, json.dumps(existing_data))
     return None
 
 
 async def set_private(conversation_id: str, user_id: str) -> None:
-    load_dotenv()
-    redis = Redis(
-        url=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_URL"),
-        token=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_TOKEN"),
-    )
-
     key = conversation_id
     existing = await redis.get(key)
 
@@ -54,17 +143,15 @@ async def set_private(conversation_id: str, user_id: str) -> None:
 
     # Set the updated value back in Redis
     await redis.set(key, json.dumps(existing_data))
+
+    await redis.delete(SNAPSHOT_PREFIX + conversation_id)
+    _snapshots.pop(conversation_id, None)
     return None
 
 
 async def get_public(conversation_id: str) -> dict:
-    history_redis = Redis(
-        url=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_URL"),
-        token=os.getenv("UPSTASH_REDIS_CONVERSATIONS_REST_TOKEN"),
-    )
-
     # Get the value from Redis
-    data = await history_redis.get(f"{conversation_id}")
+    data = await redis.get(f"{conversation_id}")
 
     # Check if the data exists and parse it, otherwise return False
     if data is None:
@@ -0,0 +1,76 @@
+"""Share one async event stream between concurrent requests with the same key.
+
+Kept apart from app/coalesce.py, which builds the agent on import.
+"""
+
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+
+class _Flight:
+    def __init__(self):
+        self.items: List[dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """Share one event stream between all concurrent requests with the same key.
+
+    Followers receive every event from the beginning of the stream. The stream
+    runs to completion even if the request that started it disconnects.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks = set()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[dict]]
+    ) -> AsyncIterator[dict]:
+        """Subscribe to the stream for key, starting it with factory if needed."""
+        if key not in self._flights:
+            flight = _Flight()
+            self._flights[key] = flight
+            task = asyncio.create_task(self._run(key, flight, factory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return self._subscribe(self._flights[key])
+
+    def join(self, key: str) -> AsyncIterator[dict]:
+        """Subscribe to an existing stream. Raises KeyError if there is none."""
+        return self._subscribe(self._flights[key])
+
+    async def _run(self, key: str, flight: _Flight, factory) -> None:
+        try:
+            async for item in factory():
+                async with flight.changed:
+                    flight.items.append(item)
+                    flight.changed.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    async def _subscribe(self, flight: _Flight) -> AsyncIterator[dict]:
+        position = 0
+        while True:
+            async with flight.changed:
+                await flight.changed.wait_for(
+                    lambda: len(flight.items) > position or flight.done
+                )
+            while position < len(flight.items):
+                yield flight.items[position]
+                position += 1
+            if flight.done and position >= len(flight.items):
+                if flight.error is not None:
+                    raise flight.error
+                return
@@ -0,0 +1,139 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from app.codec import decode_dict
+from app.history_store import (
+    HistoryWriter,
+    WriteBehindChatMessageHistory,
+    history_writer,
+)
+from app.summary import summarize
+
+# Summaries live next to the conversations ("summary:<user_id>/<conversation_id>"),
+# outside the "<user_id>*" pattern that lists a user's conversations
+SUMMARY_PREFIX = "summary:"
+# Seconds to wait after a turn before summarizing, so quick follow-ups share one call
+SUMMARY_DELAY = float(os.getenv("SUMMARY_DELAY", "10"))
+SUMMARY_RETRIES = 3
+# Seconds a worker process holds its claim on a conversation while summarizing it
+SUMMARY_LOCK_TTL = 120
+
+
+def summary_key(key: str) -> str:
+    return SUMMARY_PREFIX + key
+
+
+def summary_lock_key(key: str) -> str:
+    return SUMMARY_PREFIX + "lock:" + key
+
+
+def format_history(values: List[str]) -> str:
+    """Render stored messages, oldest first, the way the frontend did for /create_summary."""
+    lines = []
+    for value in values:
+        data = decode_dict(value)
+        content = data["data"].get("content")
+        if content:
+            lines.append(f"{data['type'].upper()}: {content}")
+    return " | ".join(lines)
+
+
+class SummaryWorker:
+    """Summarize conversations in a background thread after their turns complete.
+
+    Each summary is stored with the number of messages it covers, so a
+    conversation is only summarized again once it has new messages. A
+    conversation with nothing to summarize is stored with no summary and no
+    messages, so it is not scheduled again. Worker processes claim a
+    conversation in Redis before calling the LLM, so only one summarizes it.
+    """
+
+    def __init__(self, writer: HistoryWriter, delay: float = SUMMARY_DELAY):
+        self.writer = writer
+        self.redis = writer.redis
+        self.delay = delay
+        self._start()
+        # Like the history writer, each forked worker process runs its own thread
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._due: Dict[str, float] = {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, key: str) -> None:
+        """Summarize the conversation at key soon, unless already scheduled."""
+        with self._lock:
+            if key in self._due:
+                return
+            self._due[key] = time.monotonic() + self.delay
+        self._queue.put(key)
+
+    def _run(self) -> None:
+        while True:
+            key = self._queue.get()
+            with self._lock:
+                due = self._due[key]
+            time.sleep(max(0.0, due - time.monotonic()))
+            with self._lock:
+                # Turns completing from here on schedule another run
+                del self._due[key]
+            for attempt in range(SUMMARY_RETRIES):
+                try:
+                    self.summarize(key)
+                    break
+                except Exception as e:
+                    if attempt == SUMMARY_RETRIES - 1:
+                        print(f"Could not summarize {key}: {e}")
+                    else:
+                        time.sleep(2**attempt)
+
+    def summarize(self, key: str) -> Optional[str]:
+        """Summarize the conversation at key if its summary is missing or stale."""
+        values = self.writer.read(key)
+        stored = self.redis.get(summary_key(key))
+        if stored is not None and json.loads(stored).get("messages") == len(values):
+            return json.loads(stored)["summary"]
+        if not values:
+            self.redis.set(
+                summary_key(key), json.dumps({"summary": None, "messages": 0})
+            )
+            return None
+
+        if not self.redis.set(summary_lock_key(key), "1", nx=True, ex=SUMMARY_LOCK_TTL):
+            # Another worker is summarizing it; check again once it is done
+            self.schedule(key)
+            return None
+        try:
+            summary = summarize(format_history(values))
+            self.redis.set(
+                summary_key(key),
+                json.dumps({"summary": summary, "messages": len(values)}),
+            )
+        finally:
+            self.redis.delete(summary_lock_key(key))
+        return summary
+
+
+summary_worker = SummaryWorker(history_writer)
+
+
+class SummarizedChatMessageHistory(WriteBehindChatMessageHistory):
+    """Chat history that schedules a new summary whenever a turn completes."""
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        super().add_messages(messages)
+        if any(isinstance(message, AIMessage) for message in messages):
+            summary_worker.schedule(self.key)
+
+    def clear(self) -> None:
+        super().clear()
+        self.writer.redis.delete(summary_key(self.key))
@@ -1,9 +1,11 @@
+import asyncio
+
 from openai import OpenAI
 
 client = OpenAI()
 
 
-async def create_summary(chat_history: str) -> str:
+def summarize(chat_history: str) -> str:
     completion = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
@@ -20,3 +22,8 @@ async def create_summary(chat_history: str) -> str:
         ],
     )
     return completion.choices[0].message.content
+
+
+async def create_summary(chat_history: str) -> str:
+    # The client is blocking; keep it off the event loop
+    return await asyncio.to_thread(summarize, chat_history)
@@ -1,14 +1,66 @@
 # 1. Handle Imports
+import asyncio
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores.upstash import UpstashVectorStore
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from upstash_vector import AsyncIndex, Index
 from dotenv import load_dotenv
 from pathlib import Path
 
+from app.breaker import vector_breaker
+from app.cache import CachedQueryEmbeddings
+from app.digests import load_digests, section_matches, testimony_matches
+
 load_dotenv()
 
 
+class AsyncUpstashVectorStore(UpstashVectorStore):
+    """UpstashVectorStore whose async search also embeds the query asynchronously.
+
+    The base class embeds the query with the blocking client even in its
+    async methods. Sync and async searches go through the circuit breaker
+    (app/breaker.py), and ``fallback(vector, k)`` answers them locally when
+    Upstash is slow or down.
+    """
+
+    def __init__(self, *args, fallback=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fallback = fallback
+
+    async def asimilarity_search_with_score(
+        self, query, k=4, filter=None, *, namespace=None, **kwargs
+    ):
+        embedding = await self._embeddings.aembed_query(query)
+
+        async def fallback():
+            if self.fallback is None:
+                return []
+            return await asyncio.to_thread(self.fallback, embedding, k)
+
+        return await vector_breaker.call(
+            lambda: self.asimilarity_search_by_vector_with_score(
+                embedding, k=k, filter=filter, namespace=namespace, **kwargs
+            ),
+            fallback,
+        )
+
+    def similarity_search_with_score(
+        self, query, k=4, filter=None, *, namespace=None, **kwargs
+    ):
+        embedding = self._embed_query(query)
+
+        def fallback():
+            return [] if self.fallback is None else self.fallback(embedding, k)
+
+        return vector_breaker.call_sync(
+            lambda: self.similarity_search_by_vector_with_score(
+                embedding, k=k, filter=filter, namespace=namespace, **kwargs
+            ),
+            fallback,
+        )
+
+
 # 2. Create Vector Database
 loader = DirectoryLoader(
     f"{Path(__file__).parent}/optimized_sources",
@@ -17,9 +69,24 @@ loader = DirectoryLoader(
 )
 fullDocs = loader.load()
 
-fullDocVectorstore = UpstashVectorStore(
-    embedding=OpenAIEmbeddings(),
+# Both namespaces share one set of clients (and HTTP connection pools). The
+# async index is what the agent uses, so queries never block the event loop.
+index = Index.from_env()
+async_index = AsyncIndex.from_env()
+# Query vectors are cached across requests and worker processes
+openai_embeddings = OpenAIEmbeddings()
+embeddings = CachedQueryEmbeddings(openai_embeddings, model=openai_embeddings.model)
+# Local read-only fallback while Upstash is unavailable: the testimony digests
+# built by app/build_digests.py, whose sections use the same embedding model.
+# Without digests, searches return nothing rather than wait on Upstash.
+digests = load_digests()
+
+fullDocVectorstore = AsyncUpstashVectorStore(
+    index=index,
+    async_index=async_index,
+    embedding=embeddings,
     namespace="full",
+    fallback=lambda vector, k: testimony_matches(digests, fullDocs, vector, k),
 )
 
 # fullDocVectorstore.add_documents(fullDocs, batch_size=10)
@@ -28,9 +95,12 @@ fullDocVectorstore = UpstashVectorStore(
 #     chunk_size=1000, chunk_overlap=200, add_start_index=True
 # )
 # all_splits = text_splitter.split_documents(fullDocs)
-splitDocVectorstore = UpstashVectorStore(
-    embedding=OpenAIEmbeddings(),
+splitDocVectorstore = AsyncUpstashVectorStore(
+    index=index,
+    async_index=async_index,
+    embedding=embeddings,
     namespace="split",
+    fallback=lambda vector, k: section_matches(digests, vector, k),
 )
 
 # splitDocVectorstore.add_documents(all_splits)
@@ -0,0 +1,18 @@
+# Multi-worker launch: poetry run gunicorn app.server:app -c gunicorn.conf.py
+#
+# The app is imported once in the master (loading the source documents and
+# clients) and forked into the workers, so startup work is shared through
+# copy-on-write memory. Set CACHE_REDIS_URL to a local Redis to share caches
+# and rate limits between the workers.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Chat responses are long-lived event streams
+timeout = 120
+graceful_timeout = 30
+keepalive = 75
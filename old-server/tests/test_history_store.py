@@ -0,0 +1,115 @@
+import threading
+from typing import Dict, List
+
+from app.history_store import HistoryWriter
+
+
+class FakeRedis:
+    """The list commands HistoryWriter uses. Pipelines wait for ``gate``."""
+
+    def __init__(self):
+        self.lists: Dict[str, List[str]] = {}
+        self.gate = threading.Event()
+        self.gate.set()
+        self.executing = threading.Event()
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def delete(self, key):
+        self.commands.append(("delete", key, None))
+
+    def lpush(self, key, *values):
+        self.commands.append(("lpush", key, values))
+
+    def exec(self):
+        self.redis.executing.set()
+        self.redis.gate.wait()
+        for command, key, values in self.commands:
+            if command == "delete":
+                self.redis.lists.pop(key, None)
+            else:
+                self.redis.lists[key] = list(reversed(values)) + self.redis.lists.get(
+                    key, []
+                )
+
+
+def _hold_writes(redis: FakeRedis, writer: HistoryWriter) -> None:
+    """Block the writer thread inside its next pipeline."""
+    redis.gate.clear()
+    redis.executing.clear()
+    writer.append("held", ["x"])
+    assert redis.executing.wait(1)
+
+
+def test_appends_are_read_before_and_after_they_are_written():
+    redis = FakeRedis()
+    writer = HistoryWriter(redis)
+    _hold_writes(redis, writer)
+
+    writer.append("user/1", ["a", "b"])
+    writer.append("user/1", ["c"])
+    assert writer.read("user/1") == ["a", "b", "c"]
+
+    redis.gate.set()
+    writer.flush()
+    assert redis.lists["user/1"] == ["c", "b", "a"]
+    assert writer.read("user/1") == ["a", "b", "c"]
+
+
+def test_cached_history_includes_later_appends():
+    redis = FakeRedis()
+    redis.lists["user/1"] = ["b", "a"]
+    writer = HistoryWriter(redis)
+    assert writer.read("user/1") == ["a", "b"]
+
+    writer.append("user/1", ["c"])
+    writer.flush()
+    assert writer.read("user/1") == ["a", "b", "c"]
+
+
+def test_delete_drops_appends_queued_before_it():
+    redis = FakeRedis()
+    redis.lists["user/1"] = ["a"]
+    writer = HistoryWriter(redis)
+    _hold_writes(redis, writer)
+
+    writer.append("user/1", ["b"])
+    writer.delete("user/1")
+    writer.append("user/1", ["c"])
+    # The stored and queued messages are gone as soon as delete returns
+    assert writer.read("user/1") == ["c"]
+
+    redis.gate.set()
+    writer.flush()
+    assert redis.lists["user/1"] == ["c"]
+    assert writer.read("user/1") == ["c"]
+
+
+def test_delete_while_the_key_is_being_written():
+    redis = FakeRedis()
+    writer = HistoryWriter(redis)
+    redis.gate.clear()
+    writer.append("user/1", ["a"])
+    assert redis.executing.wait(1)
+
+    writer.delete("user/1")
+    writer.append("user/1", ["b"])
+    assert writer.read("user/1") == ["b"]
+
+    redis.gate.set()
+    writer.flush()
+    assert redis.lists["user/1"] == ["b"]
+    assert writer.read("user/1") == ["b"]
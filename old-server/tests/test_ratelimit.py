@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app import ratelimit
+from app.ratelimit import ConcurrencyLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    # One token every 6 seconds, bursts of 2
+    bucket = TokenBucket(rate_per_minute=10, burst=2)
+
+    assert asyncio.run(bucket.acquire("user")) == (True, 0.0)
+    assert asyncio.run(bucket.acquire("user")) == (True, 0.0)
+    allowed, retry_after = asyncio.run(bucket.acquire("user"))
+    assert not allowed
+    assert retry_after == pytest.approx(6)
+
+    # Other users have their own bucket
+    assert asyncio.run(bucket.acquire("other"))[0]
+
+    clock.now += 6
+    assert asyncio.run(bucket.acquire("user"))[0]
+    assert not asyncio.run(bucket.acquire("user"))[0]
+
+
+def test_bucket_drops_users_once_refilled(clock):
+    bucket = TokenBucket(rate_per_minute=10, burst=2)
+    asyncio.run(bucket.acquire("idle"))
+    clock.now += 5
+    asyncio.run(bucket.acquire("active"))
+
+    # "idle" has been refilled (12 seconds), "active" has not
+    clock.now += 7
+    asyncio.run(bucket.acquire("new"))
+    assert list(bucket._buckets) == ["active", "new"]
+
+
+def test_limiter_queues_then_rejects():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queued=1, timeout=1.0)
+        release = await limiter.acquire()
+        assert release is not None and limiter.active == 1
+
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot is taken and the queue is full
+        assert await limiter.acquire() is None
+
+        release()
+        release()  # Releasing twice frees the slot only once
+        second = await queued
+        assert second is not None and limiter.active == 1
+        second()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_gives_up_after_the_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queued=4, timeout=0.01)
+        release = await limiter.acquire()
+        assert await limiter.acquire() is None
+        assert limiter._waiting == 0
+        release()
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_raises_429_with_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "user_limiter", TokenBucket(60, 1))
+    asyncio.run(ratelimit.check_rate_limit("user"))
+    with pytest.raises(ratelimit.HTTPException) as error:
+        asyncio.run(ratelimit.check_rate_limit("user"))
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "1"}
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+class Source:
+    """An event stream that emits one event each time ``step`` is set."""
+
+    def __init__(self, events, error=None):
+        self.events = events
+        self.error = error
+        self.step = asyncio.Event()
+        self.started = 0
+
+    async def stream(self):
+        self.started += 1
+        for event in self.events:
+            await self.step.wait()
+            self.step.clear()
+            yield event
+        if self.error is not None:
+            raise self.error
+
+
+async def _collect(stream):
+    return [event async for event in stream]
+
+
+async def _emit(source, times=1):
+    for _ in range(times):
+        source.step.set()
+        while source.step.is_set():
+            await asyncio.sleep(0)
+
+
+def test_followers_share_the_leaders_stream_from_the_start():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source([{"n": 1}, {"n": 2}])
+        leader = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await _emit(source)
+
+        # A follower joining after the first event still receives it
+        follower = asyncio.create_task(_collect(flights.join("q")))
+        other = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await _emit(source)
+
+        assert await leader == [{"n": 1}, {"n": 2}]
+        assert await follower == [{"n": 1}, {"n": 2}]
+        assert await other == [{"n": 1}, {"n": 2}]
+        assert source.started == 1
+        assert "q" not in flights
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_subscriber():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source([{"n": 1}], error=RuntimeError("model failed"))
+        leader = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(_collect(flights.join("q")))
+        await _emit(source)
+
+        for subscriber in (leader, follower):
+            with pytest.raises(RuntimeError, match="model failed"):
+                await subscriber
+        assert "q" not in flights
+
+    asyncio.run(scenario())
+
+
+def test_stream_finishes_after_the_leader_disconnects():
+    async def scenario():
+        flights = SingleFlight()
+        source = Source([{"n": 1}, {"n": 2}])
+        leader = asyncio.create_task(_collect(flights.stream("q", source.stream)))
+        follower = asyncio.create_task(_collect(flights.join("q")))
+        await _emit(source)
+
+        leader.cancel()
+        await _emit(source)
+        assert await follower == [{"n": 1}, {"n": 2}]
+
+    asyncio.run(scenario())
+
+
+def test_join_without_a_flight_raises_key_error():
+    with pytest.raises(KeyError):
+        SingleFlight().join("q")